@@ -0,0 +1,54 @@
+import os
+import time
+import logging
+import argparse
+from reedsolo import RSCodec
+
+import encode
+import decode
+
+def encode_chunk_uncached(padded_data):
+    encoded = bytearray()
+    for i in range(encode.NUM_RS_BLOCKS):
+        rs_encoder = RSCodec(nsym=encode.n_sym_per_block - encode.k_sym_per_block, nsize=encode.n_sym_per_block)
+        encoded.extend(rs_encoder.encode(padded_data[i * encode.k_sym_per_block:(i + 1) * encode.k_sym_per_block]))
+    return bytes(encoded)
+
+def decode_chunk_uncached(rs_data):
+    decoded = bytearray()
+    offset = 0
+    for config in decode.RS_BLOCK_CONFIGS:
+        n, k = config['n'], config['k']
+        rs_decoder = RSCodec(n - k, nsize=n)
+        decoded_message_part, _, _ = rs_decoder.decode(rs_data[offset:offset + n])
+        decoded.extend(decoded_message_part)
+        offset += n
+    return bytes(decoded)
+
+def time_per_chunk(func, inputs):
+    start = time.perf_counter()
+    for item in inputs:
+        func(item)
+    return (time.perf_counter() - start) / len(inputs) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark per-chunk Reed-Solomon time: per-block RSCodec construction vs the current encode/decode path.')
+    parser.add_argument('--chunks', '-n', type=int, default=50, help='Number of random chunks to time (default: 50)')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    payloads = [os.urandom(encode.K_SYMBOLS_EFFECTIVE) for _ in range(args.chunks)]
+    rs_blocks = [encode.reed_solomon_encode(p)[:decode.N_SYMBOLS_EFFECTIVE_DECODE] for p in payloads]
+
+    enc_before = time_per_chunk(encode_chunk_uncached, payloads)
+    enc_after = time_per_chunk(encode.reed_solomon_encode, payloads)
+    dec_before = time_per_chunk(decode_chunk_uncached, rs_blocks)
+    dec_after = time_per_chunk(lambda data: decode.reed_solomon_decode(data, decode.K_SYMBOLS_EFFECTIVE_DECODE), rs_blocks)
+
+    print(f"Per-chunk RS time over {args.chunks} chunks ({encode.NUM_RS_BLOCKS} blocks of ({encode.n_sym_per_block},{encode.k_sym_per_block})):")
+    print(f"  encode: per-block codec {enc_before:.2f} ms, current {enc_after:.2f} ms ({enc_before / enc_after:.2f}x)")
+    print(f"  decode: per-block codec {dec_before:.2f} ms, current {dec_after:.2f} ms ({dec_before / dec_after:.2f}x)")
+
+if __name__ == "__main__":
+    main()
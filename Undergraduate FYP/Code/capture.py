@@ -1,16 +1,30 @@
 import cv2
 import os
 import time
+import hashlib
+import argparse
 import threading
+import collections
+import concurrent.futures
 from datetime import datetime
 from queue import Queue
 
+import decode
+import receive
+from common import parse_chunk_header, _CHUNK_FULL_HEADER_LEN
+from chunk_pack import ChunkPackReader, is_chunk_pack
+from frame_filter import FrameClusters
+
 OUTPUT_DIR = 'captured_c_COLOR_images/'
 CAMERA_INDEX = 0
 CAPTURE_DURATION = 180
 RESOLUTION_WIDTH = 1280
 RESOLUTION_HEIGHT = 720
 TARGET_FPS = 5
+FAILED_FRAMES_DIR = 'failed_c_COLOR_frames/'
+LIVE_DECODE_WORKERS = os.cpu_count() or 1
+LIVE_DECODE_BACKLOG = 2
+LIVE_REPEAT_BUDGET = 10
 
 def initialize_camera():
     cap = cv2.VideoCapture(CAMERA_INDEX)
@@ -90,11 +104,163 @@ def capture_images(cap):
         cap.release()
         cv2.destroyAllWindows()
 
-if __name__ == "__main__":
+def payload_digest(payload):
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+def load_header_index(sender_chunks):
+    header_index = {}
+    if is_chunk_pack(sender_chunks):
+        with ChunkPackReader(sender_chunks) as reader:
+            for chunk in reader.chunks():
+                header_index.setdefault(payload_digest(chunk[_CHUNK_FULL_HEADER_LEN:]), []).append(bytes(chunk[:_CHUNK_FULL_HEADER_LEN]))
+                chunk.release()
+        return header_index
+    for filename in os.listdir(sender_chunks):
+        if not filename.endswith('.bin'):
+            continue
+        with open(os.path.join(sender_chunks, filename), 'rb') as f:
+            chunk = f.read()
+        header_index.setdefault(payload_digest(chunk[_CHUNK_FULL_HEADER_LEN:]), []).append(chunk[:_CHUNK_FULL_HEADER_LEN])
+    return header_index
+
+def capture_images_live(cap, header_index, output_dir, key_string="", failed_dir=FAILED_FRAMES_DIR,
+                        workers=LIVE_DECODE_WORKERS, show_preview=True, force=False):
+    if not os.path.exists(failed_dir):
+        os.makedirs(failed_dir)
+
+    reassembler = receive.StreamingReassembler(output_dir, bool(key_string), key_string,
+                                               status_callback=print, force=force)
+    print(f"Starting live capture with {workers} decode workers. Press 'q' to stop early.")
+
+    save_queue = Queue(maxsize=100)
+    save_thread = threading.Thread(target=save_image_worker, args=(save_queue,))
+    save_thread.daemon = True
+    save_thread.start()
+
+    in_flight = collections.deque()
+    seen_sequences = set()
+    clusters = FrameClusters()
+    cluster_hits = {}
+    run_cluster = None
+    run_start = 0
+    stats = collections.Counter()
+    start_time = time.time()
+    last_sample_time = start_time
+    sample_interval = 1.0 / TARGET_FPS
+
+    def save_failed(frame):
+        stats['failed'] += 1
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        save_queue.put((frame, os.path.join(failed_dir, f"failed_{timestamp}.png")))
+
+    def collect(block=False):
+        while in_flight and (block or in_flight[0][0].done()):
+            future, frame, cluster_idx, sample_idx = in_flight.popleft()
+            chunk_payload, error = future.result()
+            headers = header_index.get(payload_digest(chunk_payload)) if chunk_payload is not None else None
+            if headers is None:
+                if cluster_hits.get(cluster_idx) == sample_idx:
+                    del cluster_hits[cluster_idx]
+                save_failed(frame)
+                if error is None:
+                    print("Decoded a frame whose payload matches no sender chunk header")
+                continue
+            # Chunks with identical content share a payload, so one decode can stand for several sequences.
+            new_headers = [header for header in headers
+                           if parse_chunk_header(header)['sequence_number'] not in seen_sequences]
+            if not new_headers:
+                stats['duplicate'] += 1
+                continue
+            for header in new_headers:
+                seen_sequences.add(parse_chunk_header(header)['sequence_number'])
+                stats['decoded'] += 1
+                reassembler.feed(header + chunk_payload)
+
+    try:
+        if show_preview:
+            cv2.namedWindow("Camera Feed", cv2.WINDOW_NORMAL)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=decode.init_decode_worker) as executor:
+            while (time.time() - start_time) < CAPTURE_DURATION and not reassembler.complete:
+                ret, frame = cap.read()
+                if not ret:
+                    continue
+
+                if show_preview:
+                    cv2.imshow("Camera Feed", frame)
+
+                collect()
+                current_time = time.time()
+                if current_time - last_sample_time >= sample_interval:
+                    last_sample_time = current_time
+                    stats['sampled'] += 1
+                    sample_idx = stats['sampled']
+                    try:
+                        aligned_image, fingerprint, quality = decode.locate_barcode(frame)
+                    except Exception:
+                        aligned_image = None
+                        save_failed(frame.copy())
+                    if aligned_image is not None:
+                        cluster_idx = clusters.add(fingerprint, quality, None)
+                        if cluster_idx != run_cluster:
+                            run_cluster, run_start = cluster_idx, sample_idx
+                        # A repeat is only skipped within the run of frames that produced the hit, and not for long.
+                        hit = cluster_hits.get(cluster_idx)
+                        if hit is not None and hit >= run_start and sample_idx - hit < LIVE_REPEAT_BUDGET:
+                            stats['suppressed'] += 1
+                        elif len(in_flight) < workers * LIVE_DECODE_BACKLOG:
+                            cluster_hits[cluster_idx] = sample_idx
+                            in_flight.append((executor.submit(decode.decode_frame_task, aligned_image, True),
+                                              frame.copy(), cluster_idx, sample_idx))
+                        else:
+                            stats['skipped'] += 1
+
+                if show_preview and cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("Capture stopped by user.")
+                    break
+            collect(block=True)
+    finally:
+        save_queue.put(None)
+        save_thread.join()
+        ok = reassembler.close()
+
+        print(f"Live capture finished. Frames sampled: {stats['sampled']}, decoded: {stats['decoded']}, " +
+              f"duplicates: {stats['duplicate']}, failed: {stats['failed']}, suppressed as repeats: {stats['suppressed']}, " +
+              f"skipped (pool busy): {stats['skipped']}")
+        cap.release()
+        if show_preview:
+            cv2.destroyAllWindows()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture c_COLOR frames from the camera.')
+    parser.add_argument('--live', action='store_true', help='Decode and reassemble frames as they are captured instead of saving every PNG')
+    parser.add_argument('--headers', help='Sender chunk directory or chunk pack to take chunk headers from (live mode)')
+    parser.add_argument('--output', '-o', default='output', help='Output directory for reassembled files (live mode)')
+    parser.add_argument('--key', '-k', default="", help='Decryption key (live mode, omit if the chunks are not encrypted)')
+    parser.add_argument('--workers', '-w', type=int, default=LIVE_DECODE_WORKERS, help='Decode worker processes (live mode)')
+    parser.add_argument('--force', '-f', action='store_true', help='Overwrite a non-empty output directory')
+    args = parser.parse_args()
+
+    if args.live and not args.headers:
+        parser.error("--live needs --headers to identify decoded chunks")
+
     print("Initializing camera...")
     camera = initialize_camera()
-    if camera:
-        print("Starting capture...")
-        capture_images(camera)
-    else:
+    if not camera:
         print("Camera initialization failed.")
+        return 1
+
+    if args.live:
+        header_index = load_header_index(args.headers)
+        print(f"Loaded {sum(len(headers) for headers in header_index.values())} chunk headers " +
+              f"({len(header_index)} distinct payloads) from {args.headers}")
+        ok = capture_images_live(camera, header_index, args.output, args.key, workers=args.workers, force=args.force)
+        return 0 if ok else 1
+
+    print("Starting capture...")
+    capture_images(camera)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
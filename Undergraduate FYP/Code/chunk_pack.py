@@ -0,0 +1,150 @@
+import os
+import mmap
+import struct
+import threading
+import zlib
+
+from common import parse_chunk_header, _CHUNK_FULL_HEADER_LEN
+
+CHUNK_PACK_NAME = "chunks.pack"
+CHUNK_PACK_MAGIC = b'CHUNKPK1'
+CHUNK_PACK_INDEX_MAGIC = b'CPKINDEX'
+
+_PACK_INDEX_ENTRY_STRUCT = struct.Struct('<IcQII')
+_PACK_FOOTER_STRUCT = struct.Struct('<QI8s')
+
+_TYPE_METADATA = b'M'
+_TYPE_DATA = b'C'
+
+def is_chunk_pack(path):
+    if not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+        return False
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(CHUNK_PACK_MAGIC)) == CHUNK_PACK_MAGIC
+    except OSError:
+        return False
+
+class ChunkPackWriter:
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self._file = open(pack_path, 'wb')
+        self._file.write(CHUNK_PACK_MAGIC)
+        self._offset = len(CHUNK_PACK_MAGIC)
+        self._entries = []
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def add(self, chunk_name, chunk_bytes):
+        header_info = parse_chunk_header(chunk_bytes[:_CHUNK_FULL_HEADER_LEN])
+        chunk_type = _TYPE_METADATA if header_info['is_metadata'] else _TYPE_DATA
+        checksum = zlib.crc32(chunk_bytes)
+        with self._lock:
+            if self.closed:
+                raise ValueError(f"Chunk pack {self.pack_path} is already closed")
+            self._file.write(chunk_bytes)
+            self._entries.append((header_info['sequence_number'], chunk_type, self._offset, len(chunk_bytes), checksum))
+            self._offset += len(chunk_bytes)
+        return chunk_name
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            index_offset = self._offset
+            self._entries.sort(key=lambda entry: entry[0])
+            self._file.write(b''.join(_PACK_INDEX_ENTRY_STRUCT.pack(*entry) for entry in self._entries))
+            self._file.write(_PACK_FOOTER_STRUCT.pack(index_offset, len(self._entries), CHUNK_PACK_INDEX_MAGIC))
+            self._file.close()
+
+    def abort(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._file.close()
+            os.remove(self.pack_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class ChunkPackReader:
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self._file = open(pack_path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Chunk pack {pack_path} is empty")
+        self._view = memoryview(self._map)
+        self.entries = self._read_index()
+
+    def _read_index(self):
+        pack_size = len(self._map)
+        if pack_size < len(CHUNK_PACK_MAGIC) + _PACK_FOOTER_STRUCT.size or self._view[:len(CHUNK_PACK_MAGIC)] != CHUNK_PACK_MAGIC:
+            raise ValueError(f"Not a chunk pack: {self.pack_path}")
+        index_offset, entry_count, index_magic = _PACK_FOOTER_STRUCT.unpack_from(self._map, pack_size - _PACK_FOOTER_STRUCT.size)
+        if index_magic != CHUNK_PACK_INDEX_MAGIC:
+            raise ValueError(f"Chunk pack {self.pack_path} has no index (was the writer closed?)")
+        if index_offset + entry_count * _PACK_INDEX_ENTRY_STRUCT.size != pack_size - _PACK_FOOTER_STRUCT.size:
+            raise ValueError(f"Chunk pack {self.pack_path} index is truncated or corrupt")
+        return [
+            {'sequence_number': seq, 'is_metadata': chunk_type == _TYPE_METADATA, 'offset': offset, 'length': length, 'checksum': checksum}
+            for seq, chunk_type, offset, length, checksum
+            in _PACK_INDEX_ENTRY_STRUCT.iter_unpack(self._view[index_offset:pack_size - _PACK_FOOTER_STRUCT.size])
+        ]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def chunk_view(self, entry, verify=True):
+        chunk = self._view[entry['offset']:entry['offset'] + entry['length']]
+        if verify and zlib.crc32(chunk) != entry['checksum']:
+            raise ValueError(f"Chunk pack {self.pack_path}: CRC mismatch for seq {entry['sequence_number']}")
+        return chunk
+
+    def chunks(self, verify=True, status_callback=None):
+        for entry in self.entries:
+            try:
+                yield self.chunk_view(entry, verify)
+            except ValueError as e:
+                if status_callback:
+                    status_callback(str(e))
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def export_chunk_pack(pack_path, output_dir, status_callback=None):
+    os.makedirs(output_dir, exist_ok=True)
+    exported_paths = []
+    with ChunkPackReader(pack_path) as reader:
+        for chunk in reader.chunks(status_callback=status_callback):
+            header_info = parse_chunk_header(chunk[:_CHUNK_FULL_HEADER_LEN])
+            prefix = "M" if header_info['is_metadata'] else "C"
+            chunk_path = os.path.join(output_dir, f"{prefix}_{header_info['sequence_number']}_{header_info['total_count']}.bin")
+            with open(chunk_path, 'wb') as f:
+                f.write(chunk)
+            exported_paths.append(chunk_path)
+            chunk.release()
+    if status_callback:
+        status_callback(f"Exported {len(exported_paths)} chunks from {os.path.basename(pack_path)} to {output_dir}")
+    return exported_paths
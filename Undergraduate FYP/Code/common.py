@@ -3,12 +3,21 @@ import re
 import hashlib
 import shutil
 import struct
+import functools
+import threading
+import concurrent.futures
 import numpy as np
 import psutil
 
 CHUNK_SIZE = 2895
 MAX_FILE_SIZE = 50 * 1024 * 1024  
 
+XOR_BLOCK_SIZE = 256 * 1024
+XOR_THREAD_THRESHOLD = 4 * 1024 * 1024
+XOR_THREADS = min(4, os.cpu_count() or 1)
+_XOR_EXECUTOR = None
+_XOR_EXECUTOR_LOCK = threading.Lock()
+
 def get_script_dir():
     return os.path.dirname(os.path.abspath(__file__))
 
@@ -27,74 +36,55 @@ def prepare_output_directory(directory, allow_overwrite=False):
 def string_to_key(key_string): 
     return b'' if not key_string else key_string.encode('utf-8')
 
-def xor_crypt_chunk(data, key, offset=0):
+@functools.lru_cache(maxsize=128)
+def _get_keystream(key, phase, length):
+    key_array = np.frombuffer(key, dtype=np.uint8)
+    repeats = (phase + length + len(key) - 1) // len(key)
+    keystream = np.tile(key_array, repeats)[phase:phase + length]
+    keystream.setflags(write=False)
+    return keystream
+
+def _get_xor_executor():
+    global _XOR_EXECUTOR
+    with _XOR_EXECUTOR_LOCK:
+        if _XOR_EXECUTOR is None:
+            _XOR_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=XOR_THREADS)
+        return _XOR_EXECUTOR
+
+def xor_crypt_chunk(data, key, offset=0, out=None, threaded=None):
     if not key: 
         raise ValueError("Encryption/decryption key cannot be empty")
     
+    key = bytes(key)
     key_length = len(key)
     data_length = len(data)
     
-    data_view = memoryview(data)
-    key_view = memoryview(key)
-    
-    if data_length <= 256:
-        return bytes(data_view[i] ^ key_view[(i + offset) % key_length] for i in range(data_length))
-    
-    if data_length < 8192:
-        result = bytearray(data_length)
-        if key_length > 0 and (key_length & (key_length - 1)) == 0:
-            key_mask = key_length - 1
-            for i in range(data_length):
-                result[i] = data_view[i] ^ key_view[(i + offset) & key_mask]
-        else:
-            if key_length <= 64:
-                for i_data in range(data_length):
-                    result[i_data] = data_view[i_data] ^ key_view[(i_data + offset) % key_length]
-            else: 
-                for i in range(data_length):
-                    result[i] = data_view[i] ^ key_view[(i + offset) % key_length]
-        return bytes(result)
-    
-    chunk_size = 4 * 1024 * 1024
+    data_array = np.frombuffer(data, dtype=np.uint8)
+    if out is None:
+        out_array = np.empty(data_length, dtype=np.uint8)
+    else:
+        if len(out) < data_length:
+            raise ValueError(f"Output buffer too small: {len(out)} < {data_length}")
+        out_array = np.frombuffer(out, dtype=np.uint8)[:data_length]
     
-    if data_length <= chunk_size:
-        data_array = np.frombuffer(data, dtype=np.uint8)
-        key_array = np.frombuffer(key, dtype=np.uint8)
-        
-        if key_length > 0 and (key_length & (key_length - 1)) == 0:
-            indices = (np.arange(data_length, dtype=np.uint32) + offset) & (key_length - 1)
-        else:
-            indices = (np.arange(data_length, dtype=np.uint32) + offset) % key_length
-        
-        return np.bitwise_xor(data_array, key_array[indices]).tobytes()
+    def xor_block(block_start):
+        block_end = min(block_start + XOR_BLOCK_SIZE, data_length)
+        keystream = _get_keystream(key, (offset + block_start) % key_length, block_end - block_start)
+        np.bitwise_xor(data_array[block_start:block_end], keystream, out=out_array[block_start:block_end])
     
-    result = bytearray(data_length)
-    result_view = memoryview(result)
+    if threaded is None:
+        threaded = data_length >= XOR_THREAD_THRESHOLD and XOR_THREADS > 1
     
-    for chunk_start in range(0, data_length, chunk_size):
-        chunk_end = min(chunk_start + chunk_size, data_length)
-        chunk_size_actual = chunk_end - chunk_start
-        
-        chunk_data = data_view[chunk_start:chunk_end]
-        chunk_array = np.frombuffer(chunk_data, dtype=np.uint8)
-        
-        chunk_offset = offset + chunk_start
-        if key_length > 0 and (key_length & (key_length - 1)) == 0:
-            indices = (np.arange(chunk_size_actual, dtype=np.uint32) + chunk_offset) & (key_length - 1)
-        else:
-            indices = (np.arange(chunk_size_actual, dtype=np.uint32) + chunk_offset) % key_length
-        
-        key_array = np.frombuffer(key, dtype=np.uint8)
-        chunk_key = key_array[indices]
-        
-        chunk_result = np.bitwise_xor(chunk_array, chunk_key)
-        
-        result_view[chunk_start:chunk_end] = chunk_result.tobytes()
+    if threaded:
+        list(_get_xor_executor().map(xor_block, range(0, data_length, XOR_BLOCK_SIZE)))
+    else:
+        for block_start in range(0, data_length, XOR_BLOCK_SIZE):
+            xor_block(block_start)
     
-    return bytes(result)
+    return out_array.tobytes() if out is None else out
 
 def calculate_checksum(data):
-    if isinstance(data, bytes):
+    if isinstance(data, (bytes, bytearray, memoryview)):
         return hashlib.sha256(data).hexdigest()
     if isinstance(data, str): 
         return hashlib.sha256(data.encode('utf-8')).hexdigest()
@@ -111,6 +101,9 @@ _ORD_E = ord(b'E')
 _ORD_N = ord(b'N') 
 _VERSION_V1 = b'V1'
 
+METADATA_PREFIX_MAGIC = b'MDv3'
+METADATA_PREFIX_STRUCT = struct.Struct('<4sII')
+
 def sanitize_path(path):
     return _SANITIZE_PATH_REGEX.sub('_', path)
 
@@ -3,10 +3,16 @@ import os
 import numpy as np
 import cv2
 import struct
-from reedsolo import RSCodec, ReedSolomonError
+from reedsolo import ReedSolomonError
+from rs_codec import get_rs_codec, get_batch_rs_codec
+from frame_filter import frame_fingerprint, fingerprint_distance, FrameClusters, SAME_FRAME_DISTANCE
 import argparse
 import logging
 import math
+import functools
+import re
+import concurrent.futures
+import time
 from collections import Counter
 
 VERSION = 8
@@ -39,60 +45,109 @@ logger = logging.getLogger(__name__)
 class UnsupportedFormatError(Exception):
     pass
 
-def decode_c_COLOR_payload_from_image(image_path: str) -> bytes | None:
+def decode_c_COLOR_payload_from_image(image_path: str, return_stats: bool = False):
     if not os.path.exists(image_path):
         logger.error(f"Image file not found: {image_path}")
         raise FileNotFoundError(f"Image file not found: {image_path}")
 
-    try:
-        image = cv2.imread(image_path)
-        if image is None:
-            logger.error(f"Could not read image: {image_path}")
-            raise ValueError(f"Could not read image: {image_path}")
+    image = cv2.imread(image_path)
+    if image is None:
+        logger.error(f"Could not read image: {image_path}")
+        raise ValueError(f"Could not read image: {image_path}")
+
+    return decode_c_COLOR_payload_from_frame(image, image_path, return_stats)
 
-        aligned_image = locate_and_align_patterns(image)
+def decode_c_COLOR_payload_from_frame(image, source_name: str = "<frame>", return_stats: bool = False, aligned: bool = False):
+    try:
+        aligned_image = image if aligned else locate_and_align_patterns(image)
         if aligned_image is None:
-            logger.error(f"Failed to align image: {image_path}")
+            logger.error(f"Failed to align image: {source_name}")
             return None
 
         _, version, color, error, num_bytes_from_bch = extract_bch_metadata(aligned_image)
 
         if version != VERSION or color != COLOR or error != ERROR:
             logger.error(
-                f"Unsupported c_COLOR format for {image_path}. "
+                f"Unsupported c_COLOR format for {source_name}. "
                 f"Expected V{VERSION}C{COLOR}E{ERROR}%, Got V{version}C{color}E{error}%"
             )
             raise UnsupportedFormatError(
                 f"Unsupported c_COLOR format. Expected V{VERSION}C{COLOR}E{ERROR}%, Got V{version}C{color}E{error}%"
             )
 
-        rs_data_from_image = extract_rs_data(aligned_image)
+        rs_data_from_image, pixel_distances = extract_rs_data(aligned_image, return_distances=True)
         if rs_data_from_image is None:
-            logger.error(f"Failed to extract RS data from image: {image_path}")
+            logger.error(f"Failed to extract RS data from image: {source_name}")
             return None
 
         if len(rs_data_from_image) != N_SYMBOLS_EFFECTIVE_DECODE:
             logger.warning(f"Extracted RS data length {len(rs_data_from_image)} bytes, but reed_solomon_decode expects {N_SYMBOLS_EFFECTIVE_DECODE} (N_eff). This might be handled internally by reed_solomon_decode or indicate an issue.")
 
-        chunk_payload = reed_solomon_decode(rs_data_from_image, num_bytes_from_bch)
+        erasures = rs_symbol_erasures(pixel_distances > RS_ERASURE_DISTANCE, pixel_distances)
+        chunk_payload, rs_stats = reed_solomon_decode(rs_data_from_image, num_bytes_from_bch, return_stats=True, erasures=erasures)
 
-        logger.info(f"Successfully decoded payload from {image_path}, size: {len(chunk_payload)} bytes (BCH indicated {num_bytes_from_bch}).")
+        logger.info(f"Successfully decoded payload from {source_name}, size: {len(chunk_payload)} bytes (BCH indicated {num_bytes_from_bch}).")
+        if return_stats:
+            return chunk_payload, rs_stats
         return chunk_payload
 
-    except FileNotFoundError:
-        raise
     except UnsupportedFormatError:
         raise
     except ReedSolomonError as rse:
-        logger.error(f"Reed-Solomon decoding failed for {image_path}: {rse}")
+        logger.error(f"Reed-Solomon decoding failed for {source_name}: {rse}")
         raise
     except ValueError as ve:
-        logger.error(f"ValueError during decoding of {image_path}: {ve}")
+        logger.error(f"ValueError during decoding of {source_name}: {ve}")
         raise
     except Exception as e:
-        logger.error(f"An unexpected error occurred while decoding {image_path}: {e}", exc_info=True)
+        logger.error(f"An unexpected error occurred while decoding {source_name}: {e}", exc_info=True)
         raise
 
+def decode_c_COLOR_payload_from_frames(images, source_name: str = "<frames>", return_stats: bool = False, aligned: bool = False):
+    aligned_images = []
+    for image in images:
+        try:
+            aligned_image = image if aligned else locate_and_align_patterns(image)
+        except ValueError as e:
+            logger.warning(f"Skipping a capture of {source_name} that could not be aligned: {e}")
+            continue
+        if aligned_image is not None:
+            aligned_images.append(aligned_image)
+    if not aligned_images:
+        logger.error(f"None of the {len(images)} captures of {source_name} could be aligned")
+        return None
+
+    consistent_images = reject_outlier_frames(aligned_images)
+    if len(consistent_images) < len(aligned_images):
+        logger.warning(f"Dropping {len(aligned_images) - len(consistent_images)} of {len(aligned_images)} captures of {source_name} "
+                       f"that disagree with the others on more than {COMBINE_MAX_DISAGREEMENT:.0%} of symbols")
+    if not consistent_images:
+        raise ValueError(f"The {len(aligned_images)} captures of {source_name} do not agree with each other")
+    aligned_images = consistent_images
+
+    mean_image = np.mean(np.stack(aligned_images), axis=0).round().astype(np.uint8)
+    _, version, color, error, num_bytes_from_bch = extract_bch_metadata(mean_image)
+    frame_lengths = Counter(extract_bch_metadata(aligned_image)[4] for aligned_image in aligned_images)
+    majority_length, majority_votes = frame_lengths.most_common(1)[0]
+    if 2 * majority_votes > len(aligned_images) and majority_length != num_bytes_from_bch:
+        logger.warning(f"Averaged BCH length {num_bytes_from_bch} of {source_name} disagrees with {majority_votes} of {len(aligned_images)} captures; using {majority_length}")
+        num_bytes_from_bch = majority_length
+    if version != VERSION or color != COLOR or error != ERROR:
+        raise UnsupportedFormatError(
+            f"Unsupported c_COLOR format. Expected V{VERSION}C{COLOR}E{ERROR}%, Got V{version}C{color}E{error}%"
+        )
+
+    symbols, agreement = combine_aligned_frames(aligned_images)
+    chunk_payload, rs_stats = reed_solomon_decode(
+        rs_symbols_to_bytes(symbols), num_bytes_from_bch, return_stats=True,
+        erasures=rs_symbol_erasures(agreement < COMBINE_MIN_AGREEMENT, 1.0 - agreement)
+    )
+
+    logger.info(f"Successfully decoded payload from {len(aligned_images)} combined captures of {source_name}, size: {len(chunk_payload)} bytes.")
+    if return_stats:
+        return chunk_payload, rs_stats
+    return chunk_payload
+
 def decode_c_COLOR_to_chunk(image_path, output_path):
     try:
         chunk_payload_bytes = decode_c_COLOR_payload_from_image(image_path)
@@ -296,6 +351,13 @@ def locate_and_align_patterns(image):
 
     return aligned_image
 
+def locate_barcode(image):
+    aligned_image = locate_and_align_patterns(image)
+    if aligned_image is None:
+        raise ValueError("Could not align the barcode")
+    fingerprint, quality = frame_fingerprint(aligned_image[QZ:QZ + MODULES, QZ:QZ + MODULES])
+    return aligned_image, fingerprint, quality
+
 def extract_bch_metadata(image):
     bch_bits = []
     bch_row = QZ - 1
@@ -421,68 +483,100 @@ def get_rs_pixel_path_coords():
 
     return path_coords_final
 
-def extract_rs_data(image):
-    data_bits = []
-
-    fp_regions = []
-    fp_regions.append({'r_start': QZ, 'r_end': QZ + FP_SIZE, 'c_start': QZ, 'c_end': QZ + FP_SIZE})
-    fp_regions.append({'r_start': QZ, 'r_end': QZ + FP_SIZE, 'c_start': QZ + MODULES - FP_SIZE, 'c_end': QZ + MODULES})
-    fp_regions.append({'r_start': QZ + MODULES - FP_SIZE, 'r_end': QZ + MODULES, 'c_start': QZ, 'c_end': QZ + FP_SIZE})
-    fp_regions.append({'r_start': QZ + MODULES - FP_SIZE, 'r_end': QZ + MODULES, 'c_start': QZ + MODULES - FP_SIZE, 'c_end': QZ + MODULES})
-
-    def is_in_fp(r, c):
-        for region in fp_regions:
-            if region['r_start'] <= r < region['r_end'] and \
-               region['c_start'] <= c < region['c_end']:
-                return True
-        return False
-
-    bch_coords_set = set()
-    coords_path1_bch = []
+_RS_COLOR_MAP = {
+    (0, 0, 255): [0, 0, 0],
+    (0, 255, 0): [0, 0, 1],
+    (255, 0, 0): [0, 1, 0],
+    (0, 255, 255): [0, 1, 1],
+    (255, 0, 255): [1, 0, 0],
+    (255, 255, 0): [1, 0, 1],
+    (255, 255, 255): [1, 1, 0],
+    (0, 0, 0): [1, 1, 1]
+}
+_RS_PALETTE_BGR = np.array(list(_RS_COLOR_MAP.keys()), dtype=np.int32)
+_RS_PALETTE_CODES = np.array([(b[0] << 2) | (b[1] << 1) | b[2] for b in _RS_COLOR_MAP.values()], dtype=np.uint8)
+POOR_COLOR_MATCH_DISTANCE = 8000
+# Palette colours are 255 apart per channel; past this a pixel has two channels sitting on the decision boundary.
+RS_ERASURE_DISTANCE = 2 * 128 ** 2
+COMBINE_MAX_FRAMES = 7
+COMBINE_MIN_AGREEMENT = 0.6
+COMBINE_MAX_DISAGREEMENT = 0.5
+# Erasure hints may use at most this share of a block's parity; the rest still detects and fixes unflagged errors.
+RS_ERASURE_SHARE = 2 / 3
+
+def get_bch_path_coords():
+    coords = []
     for x_mat_1idx in range(MODULES + 4, (MODULES - 3) - 1, -1):
-        coords_path1_bch.append((13 - 1, x_mat_1idx - 1))
-    coords_path2_bch = []
+        coords.append((13 - 1, x_mat_1idx - 1))
     for y_mat_1idx in range(12, 5 - 1, -1):
-        coords_path2_bch.append((y_mat_1idx - 1, 13 - 1))
-    coords_path3_bch = []
+        coords.append((y_mat_1idx - 1, 13 - 1))
     for x_mat_1idx in range(12, 5 - 1, -1):
-        coords_path3_bch.append((13 - 1, x_mat_1idx - 1))
-    coords_path4_bch = []
-    row_path4_0idx = (MODULES - 4) - 1
+        coords.append((13 - 1, x_mat_1idx - 1))
     for x_mat_1idx in range(12, 5 - 1, -1):
-        coords_path4_bch.append((row_path4_0idx, x_mat_1idx - 1))
-    for p in coords_path1_bch + coords_path2_bch + coords_path3_bch + coords_path4_bch:
-        bch_coords_set.add(p)
-
-    rs_pixel_path = get_rs_pixel_path_coords()
+        coords.append(((MODULES - 4) - 1, x_mat_1idx - 1))
+    return coords
+
+@functools.lru_cache(maxsize=None)
+def _build_rs_extraction_map(modules, version, image_height, image_width):
+    fp_regions = [
+        (QZ, QZ + FP_SIZE, QZ, QZ + FP_SIZE),
+        (QZ, QZ + FP_SIZE, QZ + modules - FP_SIZE, QZ + modules),
+        (QZ + modules - FP_SIZE, QZ + modules, QZ, QZ + FP_SIZE),
+        (QZ + modules - FP_SIZE, QZ + modules, QZ + modules - FP_SIZE, QZ + modules),
+    ]
+    bch_coords_set = set(get_bch_path_coords())
 
-    pixels_read = 0
     expected_total_bits = N_SYMBOLS * 8
     padding_bits_added_in_encode = (3 - (expected_total_bits % 3)) % 3
-    total_bits_to_extract = expected_total_bits + padding_bits_added_in_encode
+    pixels_needed = (expected_total_bits + padding_bits_added_in_encode) // 3
 
-    for r_abs, c_abs in rs_pixel_path:
-        if len(data_bits) >= total_bits_to_extract:
+    coords = []
+    for r_abs, c_abs in get_rs_pixel_path_coords():
+        if len(coords) >= pixels_needed:
             break
-
-        if not (0 <= r_abs < image.shape[0] and 0 <= c_abs < image.shape[1]):
+        if not (0 <= r_abs < image_height and 0 <= c_abs < image_width):
             logger.warning(f"RS path coord ({r_abs},{c_abs}) is OOB. Skipping.")
             continue
-
-        if is_in_fp(r_abs, c_abs):
+        if any(r0 <= r_abs < r1 and c0 <= c_abs < c1 for r0, r1, c0, c1 in fp_regions):
             continue
-
         if (r_abs, c_abs) in bch_coords_set:
             continue
+        coords.append((r_abs, c_abs))
 
-        pixel_color = image[r_abs, c_abs]
-        bits = get_bits_from_color(pixel_color)
-        if bits:
-            data_bits.extend(bits)
-            pixels_read += 1
-        else:
-            logger.warning(f"Could not map color {pixel_color} at RS data location ({r_abs},{c_abs}) to bits. Appending [0,0,0].")
-            data_bits.extend([0,0,0])
+    coords = np.array(coords, dtype=np.intp).reshape(-1, 2)
+    coords.setflags(write=False)
+    return coords
+
+def get_rs_extraction_map(image_shape):
+    return _build_rs_extraction_map(MODULES, VERSION, image_shape[0], image_shape[1])
+
+def classify_rs_pixels(pixels):
+    pixels = np.asarray(pixels, dtype=np.int32).reshape(-1, 1, 3)
+    distances = np.sum((pixels - _RS_PALETTE_BGR[np.newaxis, :, :]) ** 2, axis=2)
+    best_idx = np.argmin(distances, axis=1)
+    min_distances = distances[np.arange(len(best_idx)), best_idx]
+    return _RS_PALETTE_CODES[best_idx], min_distances
+
+def extract_rs_data(image, return_distances=False):
+    coords = get_rs_extraction_map(image.shape[:2])
+    symbols, pixel_distances = classify_rs_pixels(image[coords[:, 0], coords[:, 1]])
+
+    poor_matches = int(np.count_nonzero(pixel_distances > POOR_COLOR_MATCH_DISTANCE))
+    if poor_matches:
+        logger.warning(f"extract_rs_data: {poor_matches} of {len(coords)} RS pixels have a poor color match (distance > {POOR_COLOR_MATCH_DISTANCE}, max {int(pixel_distances.max())}).")
+
+    rs_data_for_decode = rs_symbols_to_bytes(symbols)
+    if return_distances:
+        return rs_data_for_decode, pixel_distances
+    return rs_data_for_decode
+
+def rs_symbols_to_bytes(symbols):
+    expected_total_bits = N_SYMBOLS * 8
+    padding_bits_added_in_encode = (3 - (expected_total_bits % 3)) % 3
+    total_bits_to_extract = expected_total_bits + padding_bits_added_in_encode
+
+    pixels_read = len(symbols)
+    data_bits = ((symbols[:, np.newaxis] >> np.array([2, 1, 0], dtype=np.uint8)) & 1).astype(np.uint8).ravel()
 
     if len(data_bits) < total_bits_to_extract:
         logger.warning(f"Extracted {len(data_bits)} RS data bits (path yielded {pixels_read} pixels), but expected {total_bits_to_extract} (after padding). Data might be truncated or path is shorter than expected.")
@@ -494,7 +588,7 @@ def extract_rs_data(image):
 
     logger.info(f"extract_rs_data: Read {pixels_read} pixels. Extracted {len(data_bits)} raw bits. After removing padding: {len(actual_rs_data_bits)} bits for RS decoding (target N_SYMBOLS={N_SYMBOLS}).")
 
-    rs_data_bytes_from_pixels = bits_to_bytes(actual_rs_data_bits)
+    rs_data_bytes_from_pixels = np.packbits(actual_rs_data_bits).tobytes()
 
     if len(rs_data_bytes_from_pixels) < N_SYMBOLS_EFFECTIVE_DECODE:
         logger.error(f"Extracted data ({len(rs_data_bytes_from_pixels)}) is less than N_SYMBOLS_EFFECTIVE_DECODE ({N_SYMBOLS_EFFECTIVE_DECODE}). Padding with zeros.")
@@ -507,53 +601,43 @@ def extract_rs_data(image):
 
     return rs_data_for_decode
 
-def get_bits_from_color(color):
-    b, g, r = color
-    b, g, r = int(b), int(g), int(r)
-
-    color_map_rs = {
-        (0, 0, 255): [0, 0, 0],
-        (0, 255, 0): [0, 0, 1],
-        (255, 0, 0): [0, 1, 0],
-        (0, 255, 255): [0, 1, 1],
-        (255, 0, 255): [1, 0, 0],
-        (255, 255, 0): [1, 0, 1],
-        (255, 255, 255): [1, 1, 0],
-        (0, 0, 0): [1, 1, 1]
-    }
-
-    best_match = None
-    min_distance = float('inf')
-
-    for key_color, bits in color_map_rs.items():
-        kb, kg, kr = int(key_color[0]), int(key_color[1]), int(key_color[2])
-        distance = (b - kb)**2 + (g - kg)**2 + (r - kr)**2
-
-        if distance < min_distance:
-            min_distance = distance
-            best_match = bits
-
-    if min_distance > 8000:
-        logger.warning(f"Poor color match for color {color}. Closest mapped color is {min_distance} away. This might indicate an issue.")
-
-    return best_match
+def rs_symbol_erasures(pixel_mask, pixel_scores=None):
+    pixel_idx = np.flatnonzero(pixel_mask)
+    scores = np.asarray(pixel_scores, dtype=np.float64)[pixel_idx] if pixel_scores is not None else np.ones(len(pixel_idx))
+    byte_scores = np.zeros(sum(config['n'] for config in RS_BLOCK_CONFIGS), dtype=np.float64)
+    for byte_idx in ((pixel_idx * 3) // 8, (pixel_idx * 3 + 2) // 8):
+        in_range = byte_idx < len(byte_scores)
+        np.maximum.at(byte_scores, byte_idx[in_range], scores[in_range])
 
-def bits_to_bytes(bits):
-    padding = 8 - (len(bits) % 8) if len(bits) % 8 != 0 else 0
-    if padding:
-        bits = bits + [0] * padding
-
-    byte_values = []
-    for i in range(0, len(bits), 8):
-        byte = 0
-        for j in range(8):
-            if i + j < len(bits):
-                byte = (byte << 1) | bits[i + j]
-        byte_values.append(byte)
-
-    return bytes(byte_values)
-
-def reed_solomon_decode(rs_data, original_size_from_bch):
+    erasures = []
+    block_offset = 0
+    for config in RS_BLOCK_CONFIGS:
+        block_scores = byte_scores[block_offset:block_offset + config['n']]
+        positions = np.flatnonzero(block_scores)
+        budget = int((config['n'] - config['k']) * RS_ERASURE_SHARE)
+        if len(positions) > budget:
+            positions = np.sort(positions[np.argsort(block_scores[positions], kind='stable')[::-1][:budget]])
+        erasures.append(positions.tolist())
+        block_offset += config['n']
+    return erasures
+
+def reject_outlier_frames(aligned_images):
+    coords = get_rs_extraction_map(aligned_images[0].shape[:2])
+    pixels = np.stack([image[coords[:, 0], coords[:, 1]] for image in aligned_images]).astype(np.int32)
+    frame_symbols = np.stack([classify_rs_pixels(frame_pixels)[0] for frame_pixels in pixels])
+    consensus, _ = classify_rs_pixels(np.median(pixels, axis=0))
+    disagreement = (frame_symbols != consensus).mean(axis=1)
+    return [image for image, share in zip(aligned_images, disagreement) if share <= COMBINE_MAX_DISAGREEMENT]
+
+def combine_aligned_frames(aligned_images):
+    coords = get_rs_extraction_map(aligned_images[0].shape[:2])
+    pixels = np.stack([image[coords[:, 0], coords[:, 1]] for image in aligned_images]).astype(np.int32)
+    frame_symbols = np.stack([classify_rs_pixels(frame_pixels)[0] for frame_pixels in pixels])
+    symbols, _ = classify_rs_pixels(pixels.mean(axis=0))
+    agreement = (frame_symbols == symbols).mean(axis=0)
+    return symbols, agreement
+
+def reed_solomon_decode(rs_data, original_size_from_bch, return_stats=False, erasures=None):
     if len(rs_data) != N_SYMBOLS_EFFECTIVE_DECODE:
         logger.error(f"reed_solomon_decode: Expected {N_SYMBOLS_EFFECTIVE_DECODE} bytes of RS data (N_eff), got {len(rs_data)}. Adjusting.")
         if len(rs_data) < N_SYMBOLS_EFFECTIVE_DECODE:
@@ -561,10 +645,19 @@ def reed_solomon_decode(rs_data, original_size_from_bch):
         else:
             rs_data = rs_data[:N_SYMBOLS_EFFECTIVE_DECODE]
 
+    block_shapes = {(config['n'], config['k']) for config in RS_BLOCK_CONFIGS}
+    if len(block_shapes) == 1:
+        n_uniform, k_uniform = next(iter(block_shapes))
+        rs_blocks = np.frombuffer(bytes(rs_data), dtype=np.uint8).reshape(len(RS_BLOCK_CONFIGS), n_uniform)
+        clean_blocks = get_batch_rs_codec(n_uniform, k_uniform).clean_block_mask(rs_blocks)
+    else:
+        clean_blocks = [False] * len(RS_BLOCK_CONFIGS)
+
     decoded_payload_bytes = bytearray()
     current_rs_data_offset = 0
+    rs_stats = {'clean_blocks': 0, 'corrected_blocks': 0, 'corrected_symbols': 0, 'erasures': 0}
 
-    for config in RS_BLOCK_CONFIGS:
+    for block_idx, config in enumerate(RS_BLOCK_CONFIGS):
         n = config['n']
         k = config['k']
 
@@ -575,11 +668,32 @@ def reed_solomon_decode(rs_data, original_size_from_bch):
             logger.error(f"Not enough data for RS block (n={n}). Expected {n}, got {len(block_rs_data)}. Skipping block.")
             continue
 
-        rs_decoder = RSCodec(n - k, nsize=n)
+        if clean_blocks[block_idx]:
+            decoded_payload_bytes.extend(block_rs_data[:k])
+            rs_stats['clean_blocks'] += 1
+            continue
+
+        rs_decoder = get_rs_codec(n, k)
+        erase_pos = erasures[block_idx] if erasures else None
+        if erase_pos and len(erase_pos) > n - k:
+            logger.warning(f"RS block {block_idx} has {len(erase_pos)} erasure hints, more than its {n - k} parity symbols. Decoding without them.")
+            erase_pos = None
 
         try:
-            decoded_message_part, _, err_stat = rs_decoder.decode(bytes(block_rs_data))
+            try:
+                decoded_message_part, _, err_stat = rs_decoder.decode(bytes(block_rs_data), erase_pos=erase_pos or None)
+                rs_stats['erasures'] += len(erase_pos or ())
+            except ReedSolomonError:
+                if not erase_pos:
+                    raise
+                logger.warning(f"RS block {block_idx} failed with {len(erase_pos)} erasure hints. Retrying without them.")
+                decoded_message_part, _, err_stat = rs_decoder.decode(bytes(block_rs_data))
             decoded_payload_bytes.extend(decoded_message_part)
+            if err_stat:
+                rs_stats['corrected_blocks'] += 1
+                rs_stats['corrected_symbols'] += len(err_stat)
+            else:
+                rs_stats['clean_blocks'] += 1
 
         except ReedSolomonError as e:
             logger.error(f"Reed-Solomon decoding error for a block (n={n}, k={k}): {str(e)}. This chunk is corrupted.")
@@ -608,7 +722,9 @@ def reed_solomon_decode(rs_data, original_size_from_bch):
         elif original_size_from_bch > max_payload_after_decode:
              logger.warning(f"Final data truncated to {len(final_data)} because BCH original size {original_size_from_bch} exceeded K_eff {max_payload_after_decode}.")
 
-    logger.info(f"RS decoding complete. Original size from BCH: {original_size_from_bch}. Decoded payload length (K_eff): {len(decoded_payload_bytes)}. Final data length: {len(final_data)}.")
+    logger.info(f"RS decoding complete. Original size from BCH: {original_size_from_bch}. Decoded payload length (K_eff): {len(decoded_payload_bytes)}. Final data length: {len(final_data)}. Clean blocks: {rs_stats['clean_blocks']}, corrected blocks: {rs_stats['corrected_blocks']} ({rs_stats['corrected_symbols']} symbols, {rs_stats['erasures']} erasure hints).")
+    if return_stats:
+        return bytes(final_data), rs_stats
     return bytes(final_data)
 
 def process_image(image_path, output_dir):
@@ -624,11 +740,152 @@ def process_image(image_path, output_dir):
         logger.error(f"Error decoding image {image_path}: {str(e)}")
         raise
 
+_SEQUENCE_NAME_RE = re.compile(r'^([MC])_(\d+)_(\d+)')
+
+def image_sequence_key(image_path):
+    name = os.path.basename(image_path)
+    match = _SEQUENCE_NAME_RE.match(name)
+    if match:
+        return (0, int(match.group(2)), name)
+    return (1, 0, name)
+
+def init_decode_worker():
+    get_rs_extraction_map((MODULES + 2 * QZ, MODULES + 2 * QZ))
+    for config in RS_BLOCK_CONFIGS:
+        get_batch_rs_codec(config['n'], config['k'])
+
+def _decode_image_task(image_path):
+    try:
+        chunk_payload = decode_c_COLOR_payload_from_image(image_path)
+        if chunk_payload is None:
+            return image_path, None, f"Decoding payload from {image_path} returned None."
+        return image_path, chunk_payload, None
+    except Exception as e:
+        return image_path, None, str(e)
+
+def decode_frame_task(frame, aligned=False):
+    try:
+        chunk_payload = decode_c_COLOR_payload_from_frame(frame, "<live frame>", aligned=aligned)
+        if chunk_payload is None:
+            return None, "Decoding payload from live frame returned None."
+        return chunk_payload, None
+    except Exception as e:
+        return None, str(e)
+
+def decode_images_parallel(image_paths, workers=None):
+    ordered_paths = sorted(image_paths, key=image_sequence_key)
+    if not ordered_paths:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        init_decode_worker()
+        for image_path in ordered_paths:
+            yield _decode_image_task(image_path)
+        return
+
+    tasks_per_submit = max(1, len(ordered_paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_decode_worker) as executor:
+        yield from executor.map(_decode_image_task, ordered_paths, chunksize=tasks_per_submit)
+
+def _fingerprint_image_task(image_path):
+    image = cv2.imread(image_path)
+    if image is None:
+        return image_path, None, 0.0, f"Could not read image: {image_path}"
+    try:
+        aligned_image, fingerprint, quality = locate_barcode(image)
+    except Exception as e:
+        return image_path, None, None, 0.0, str(e)
+    return image_path, aligned_image, fingerprint, quality, None
+
+def _decode_cluster_task(candidates):
+    results = []
+    winners = []
+    failed = []
+    errors = []
+    attempts = 0
+    for image_path, aligned_image, fingerprint in candidates:
+        if any(fingerprint_distance(fingerprint, winner) < SAME_FRAME_DISTANCE for winner in winners):
+            continue
+        attempts += 1
+        try:
+            chunk_payload = decode_c_COLOR_payload_from_frame(aligned_image, image_path, aligned=True)
+            error = None if chunk_payload is not None else f"Decoding payload from {image_path} returned None."
+        except Exception as e:
+            error = str(e)
+        if error is not None:
+            failed.append((image_path, aligned_image, fingerprint))
+            errors.append(error)
+            continue
+        winners.append(fingerprint)
+        if all(chunk_payload != payload for _, payload, _ in results):
+            results.append((image_path, chunk_payload, None))
+
+    # Failed captures far from every decoded one may be a different frame that was grouped in by mistake.
+    failed = [(image_path, aligned_image) for image_path, aligned_image, fingerprint in failed
+              if all(fingerprint_distance(fingerprint, winner) >= SAME_FRAME_DISTANCE for winner in winners)]
+    failed_paths = [image_path for image_path, _ in failed]
+    if not failed_paths:
+        return results, attempts
+
+    if len(failed_paths) > 1:
+        images = [aligned_image for _, aligned_image in failed[:COMBINE_MAX_FRAMES]]
+        attempts += 1
+        try:
+            chunk_payload = decode_c_COLOR_payload_from_frames(images, failed_paths[0], aligned=True)
+            if chunk_payload is not None:
+                if all(chunk_payload != payload for _, payload, _ in results):
+                    results.append((failed_paths[0], chunk_payload, None))
+                return results, attempts
+        except Exception as e:
+            errors.append(f"combined decode of {len(images)} captures: {e}")
+    if results:
+        error = f"{len(failed_paths)} captures unlike the decoded one failed, best: {errors[0]}"
+    else:
+        error = f"all {len(failed_paths)} captures failed, best: {errors[0]}"
+    results.append((failed_paths[0], None, error))
+    return results, attempts
+
+def decode_image_clusters(image_paths, workers=None):
+    ordered_paths = sorted(image_paths, key=image_sequence_key)
+    if not ordered_paths:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_decode_worker) if workers > 1 else None
+    try:
+        clusters = FrameClusters()
+        tasks_per_submit = max(1, len(ordered_paths) // (workers * 4))
+        fingerprints = executor.map(_fingerprint_image_task, ordered_paths, chunksize=tasks_per_submit) if executor \
+            else map(_fingerprint_image_task, ordered_paths)
+        # Keep each aligned grid so the decode starts from it instead of reading and aligning the capture again.
+        for image_path, aligned_image, fingerprint, quality, error in fingerprints:
+            if error is not None:
+                yield image_path, None, error
+                continue
+            clusters.add(fingerprint, quality, (image_path, aligned_image, fingerprint))
+
+        logger.info(f"Grouped {len(ordered_paths)} captures into {len(clusters)} distinct frames")
+        candidate_lists = [clusters.candidates(cluster_idx) for cluster_idx in range(len(clusters))]
+        if executor is None:
+            init_decode_worker()
+        results = executor.map(_decode_cluster_task, candidate_lists) if executor else map(_decode_cluster_task, candidate_lists)
+        decode_attempts = 0
+        for cluster_results, attempts in results:
+            decode_attempts += attempts
+            yield from cluster_results
+        logger.info(f"Decoded {len(clusters)} distinct frames with {decode_attempts} decode attempts for {len(ordered_paths)} captures")
+    finally:
+        if executor:
+            executor.shutdown()
+
 def main():
     parser = argparse.ArgumentParser(description='Decode c_COLOR images to file chunks.')
     parser.add_argument('--input', '-i', required=True, help='Input c_COLOR image or directory')
     parser.add_argument('--output', '-o', required=True, help='Output directory for decoded chunks')
     parser.add_argument('--force', '-f', action='store_true', help='Force decoding even with errors')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Worker processes for directory mode (default: 1, 0 = all CPUs)')
+    parser.add_argument('--dedup', action='store_true', help='Group repeated captures of the same frame and decode only the sharpest one that succeeds')
     args = parser.parse_args()
 
     if os.path.isfile(args.input):
@@ -644,10 +901,28 @@ def main():
     elif os.path.isdir(args.input):
         success_count = 0
         fail_count = 0
-
-        for filename in os.listdir(args.input):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                image_path = os.path.join(args.input, filename)
+        start_time = time.perf_counter()
+
+        image_paths = [os.path.join(args.input, filename) for filename in os.listdir(args.input)
+                       if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+
+        if args.workers != 1 or args.dedup:
+            os.makedirs(args.output, exist_ok=True)
+            decoded_images = decode_image_clusters(image_paths, args.workers) if args.dedup \
+                else decode_images_parallel(image_paths, args.workers)
+            for image_path, chunk_payload, error in decoded_images:
+                if error is not None:
+                    logger.error(f"Error decoding image {image_path}: {error}")
+                    fail_count += 1
+                    continue
+                output_path = os.path.join(args.output, f"{os.path.splitext(os.path.basename(image_path))[0]}.bin")
+                with open(output_path, 'wb') as f:
+                    f.write(chunk_payload)
+                logger.info(f"Successfully decoded image to {output_path}")
+                success_count += 1
+        else:
+            for image_path in image_paths:
+                filename = os.path.basename(image_path)
                 try:
                     output_path = process_image(image_path, args.output)
                     logger.info(f"Successfully decoded image to {output_path}")
@@ -659,7 +934,9 @@ def main():
                     logger.error(f"Error decoding image {image_path}: {str(e)}")
                     fail_count += 1
 
-        logger.info(f"Decoding complete: {success_count} images decoded, {fail_count} failed")
+        elapsed = time.perf_counter() - start_time
+        rate = (success_count + fail_count) / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Decoding complete: {success_count} images decoded, {fail_count} failed in {elapsed:.2f}s ({rate:.1f} images/sec)")
         if fail_count > 0 and not args.force:
             return 1
     else:
@@ -669,4 +946,4 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
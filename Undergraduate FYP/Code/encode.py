@@ -2,9 +2,12 @@ import os
 import numpy as np
 import cv2
 import struct
-from reedsolo import RSCodec
+from rs_codec import get_rs_codec, get_batch_rs_codec
 import argparse
 import logging
+import functools
+import time
+import concurrent.futures
 
 VERSION = 8
 COLOR = 8
@@ -56,7 +59,7 @@ def is_valid_for_data(r_0idx, c_0idx, image_width_modules, image_height_modules)
     return True
 
 
-def encode_chunk_to_c_COLOR(chunk_data, output_path, scale_factor=10):
+def encode_chunk_to_frame(chunk_data, scale_factor=10):
     if len(chunk_data) > K_SYMBOLS:
         raise ValueError(f"Chunk size {len(chunk_data)} exceeds maximum of {K_SYMBOLS} bytes (Adjusted Capacity K_eff)")
 
@@ -68,9 +71,12 @@ def encode_chunk_to_c_COLOR(chunk_data, output_path, scale_factor=10):
     c_COLOR_image = create_c_COLOR_pattern(rs_data, bch_data)
 
     if scale_factor > 1:
-        enlarged_image = cv2.resize(c_COLOR_image, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_NEAREST)
-    else:
-        enlarged_image = c_COLOR_image
+        return cv2.resize(c_COLOR_image, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_NEAREST)
+    return c_COLOR_image
+
+
+def encode_chunk_to_c_COLOR(chunk_data, output_path, scale_factor=10):
+    enlarged_image = encode_chunk_to_frame(chunk_data, scale_factor)
 
     os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
     cv2.imwrite(output_path, enlarged_image, [cv2.IMWRITE_PNG_COMPRESSION, 0])
@@ -132,8 +138,6 @@ def reed_solomon_encode(data_bytes):
     if sum(n_block_defs) != N_SYMBOLS_EFFECTIVE:
         raise ValueError(f"Custom n_block_defs sum {sum(n_block_defs)} != N_SYMBOLS_EFFECTIVE {N_SYMBOLS_EFFECTIVE}")
 
-    nsym_block_defs = [n - k for n, k in zip(n_block_defs, k_block_defs)]
-
     padded_data = bytearray(data_bytes)
     if len(padded_data) < K_SYMBOLS_EFFECTIVE:
         num_padding_bytes = K_SYMBOLS_EFFECTIVE - len(padded_data)
@@ -143,24 +147,28 @@ def reed_solomon_encode(data_bytes):
         logger.warning(f"Input data length {len(padded_data)} exceeds K_SYMBOLS_EFFECTIVE {K_SYMBOLS_EFFECTIVE}. Truncating.")
         padded_data = padded_data[:K_SYMBOLS_EFFECTIVE]
 
-    all_encoded_data = bytearray()
-    current_data_idx = 0
+    if len(set(zip(n_block_defs, k_block_defs))) == 1:
+        batch_codec = get_batch_rs_codec(n_block_defs[0], k_block_defs[0])
+        data_blocks = np.frombuffer(bytes(padded_data), dtype=np.uint8).reshape(num_blocks, k_per_block)
+        all_encoded_data = bytearray(batch_codec.encode_blocks(data_blocks).tobytes())
+    else:
+        all_encoded_data = bytearray()
+        current_data_idx = 0
 
-    for i in range(len(k_block_defs)):
-        k_val = k_block_defs[i]
-        n_val = n_block_defs[i]
-        nsym_val = nsym_block_defs[i]
+        for i in range(len(k_block_defs)):
+            k_val = k_block_defs[i]
+            n_val = n_block_defs[i]
 
-        rs_encoder = RSCodec(nsym=nsym_val, nsize=n_val)
+            rs_encoder = get_rs_codec(n_val, k_val)
 
-        data_segment = padded_data[current_data_idx: current_data_idx + k_val]
-        current_data_idx += k_val
+            data_segment = padded_data[current_data_idx: current_data_idx + k_val]
+            current_data_idx += k_val
 
-        if len(data_segment) < k_val:
-            data_segment.extend([0] * (k_val - len(data_segment)))
+            if len(data_segment) < k_val:
+                data_segment.extend([0] * (k_val - len(data_segment)))
 
-        encoded_segment = rs_encoder.encode(bytes(data_segment))
-        all_encoded_data.extend(encoded_segment)
+            encoded_segment = rs_encoder.encode(bytes(data_segment))
+            all_encoded_data.extend(encoded_segment)
 
     if len(all_encoded_data) != N_SYMBOLS_EFFECTIVE:
         logger.error(f"CRITICAL: Multi-block RS encoding produced {len(all_encoded_data)} bytes, expected {N_SYMBOLS_EFFECTIVE} bytes.")
@@ -285,92 +293,93 @@ def get_color_for_bits(bits_tuple):
     return colors.get(color_code, [128, 128, 128])
 
 
+def get_bch_path_coords():
+    coords = []
+    for x_mat_1idx in range(MODULES + 4, (MODULES - 3) - 1, -1):
+        coords.append((13 - 1, x_mat_1idx - 1))
+    for y_mat_1idx in range(12, 5 - 1, -1):
+        coords.append((y_mat_1idx - 1, 13 - 1))
+    for x_mat_1idx in range(12, 5 - 1, -1):
+        coords.append((13 - 1, x_mat_1idx - 1))
+    for x_mat_1idx in range(12, 5 - 1, -1):
+        coords.append(((MODULES - 4) - 1, x_mat_1idx - 1))
+    return coords
+
+
+def get_rs_pixel_path_coords():
+    path_coords = []
+
+    for x_mat_1idx in range(MODULES + 4, (MODULES - 3) - 1, -1):
+        for y_mat_1idx in range(MODULES - 5, 14 - 1, -1):
+            path_coords.append((y_mat_1idx - 1, x_mat_1idx - 1))
+
+    for y_mat_1idx in range(MODULES - 5, 5 - 1, -1):
+        path_coords.append((y_mat_1idx - 1, (MODULES - 4) - 1))
+
+    for x_mat_1idx in range(MODULES - 5, 14 - 1, -1):
+        for y_mat_1idx in range(MODULES + 4, 5 - 1, -1):
+            path_coords.append((y_mat_1idx - 1, x_mat_1idx - 1))
+
+    for y_mat_1idx in range(MODULES + 4, 13 - 1, -1):
+        path_coords.append((y_mat_1idx - 1, 13 - 1))
+
+    for x_mat_1idx in range(12, 5 - 1, -1):
+        for y_mat_1idx in range(MODULES - 5, 14 - 1, -1):
+            path_coords.append((y_mat_1idx - 1, x_mat_1idx - 1))
+
+    return path_coords
+
+
+@functools.lru_cache(maxsize=None)
+def _build_rs_placement_map(modules, version):
+    image_size = modules + 8
+    bch_coords_set = set(get_bch_path_coords())
+
+    placement = [
+        (r, c) for r, c in get_rs_pixel_path_coords()
+        if is_valid_for_data(r, c, image_size, image_size) and (r, c) not in bch_coords_set
+    ]
+    coords = np.array(placement, dtype=np.intp).reshape(-1, 2)
+    coords.setflags(write=False)
+
+    potential_rs_pixels = sum(
+        1 for r in range(image_size) for c in range(image_size)
+        if is_valid_for_data(r, c, image_size, image_size) and (r, c) not in bch_coords_set
+    )
+
+    return coords, potential_rs_pixels, len(bch_coords_set)
+
+
+def get_rs_placement_map():
+    return _build_rs_placement_map(MODULES, VERSION)
+
+
+_RS_COLOR_LUT = np.array(
+    [get_color_for_bits(((code >> 2) & 1, (code >> 1) & 1, code & 1)) for code in range(8)],
+    dtype=np.uint8
+)
+
+
 def place_rs_data(image, rs_data):
     image_height, image_width = image.shape[:2]
 
-    data_bits = []
-    for byte_val in rs_data:
-        for i in range(7, -1, -1):
-            data_bits.append((byte_val >> i) & 1)
+    data_bits = np.unpackbits(np.frombuffer(rs_data, dtype=np.uint8))
 
     remainder = len(data_bits) % 3
     if remainder != 0:
         padding_needed = 3 - remainder
-        data_bits.extend([0] * padding_needed)
+        data_bits = np.concatenate((data_bits, np.zeros(padding_needed, dtype=np.uint8)))
         logger.info(f"Padded RS data with {padding_needed} zero bits. New len: {len(data_bits)}")
 
-    bit_idx = 0
-    pixels_colored = 0
+    symbols = data_bits.reshape(-1, 3)
+    symbols = (symbols[:, 0] << 2) | (symbols[:, 1] << 1) | symbols[:, 2]
 
-    bch_coords_set = set()
-    coords_path1 = []
-    for x_mat_1idx in range(MODULES + 4, (MODULES - 3) - 1, -1):
-        coords_path1.append((13 - 1, x_mat_1idx - 1))
-    coords_path2 = []
-    for y_mat_1idx in range(12, 5 - 1, -1):
-        coords_path2.append((y_mat_1idx - 1, 13 - 1))
-    coords_path3 = []
-    for x_mat_1idx in range(12, 5 - 1, -1):
-        coords_path3.append((13 - 1, x_mat_1idx - 1))
-    coords_path4 = []
-    for x_mat_1idx in range(12, 5 - 1, -1):
-        coords_path4.append(((MODULES - 4) - 1, x_mat_1idx - 1))
-    for p in coords_path1 + coords_path2 + coords_path3 + coords_path4:
-        bch_coords_set.add(p)
-
-    def encode_pixel_at(r_img_0idx, c_img_0idx):
-        nonlocal bit_idx, pixels_colored
-
-        if not is_valid_for_data(r_img_0idx, c_img_0idx, image_width, image_height):
-            return True
-
-        if (r_img_0idx, c_img_0idx) in bch_coords_set:
-            return True
-
-        if bit_idx <= len(data_bits) - 3:
-            pixel_bits_tuple = tuple(data_bits[bit_idx: bit_idx + 3])
-            color = get_color_for_bits(pixel_bits_tuple)
-            image[r_img_0idx, c_img_0idx] = color
-            bit_idx += 3
-            pixels_colored += 1
-            return True
-        return False
+    placement_coords, potential_rs_pixels, bch_pixels = get_rs_placement_map()
 
-    if bit_idx <= len(data_bits) - 3:
-        for x_mat_1idx in range(MODULES + 4, (MODULES - 3) - 1, -1):
-            c_img_0idx = x_mat_1idx - 1
-            for y_mat_1idx in range(MODULES - 5, 14 - 1, -1):
-                r_img_0idx = y_mat_1idx - 1
-                if not encode_pixel_at(r_img_0idx, c_img_0idx): break
-            if not (bit_idx <= len(data_bits) - 3): break
-
-    if bit_idx <= len(data_bits) - 3:
-        c_img_0idx = (MODULES - 4) - 1
-        for y_mat_1idx in range(MODULES - 5, 5 - 1, -1):
-            r_img_0idx = y_mat_1idx - 1
-            if not encode_pixel_at(r_img_0idx, c_img_0idx): break
-
-    if bit_idx <= len(data_bits) - 3:
-        for x_mat_1idx in range(MODULES - 5, 14 - 1, -1):
-            c_img_0idx = x_mat_1idx - 1
-            for y_mat_1idx in range(MODULES + 4, 5 - 1, -1):
-                r_img_0idx = y_mat_1idx - 1
-                if not encode_pixel_at(r_img_0idx, c_img_0idx): break
-            if not (bit_idx <= len(data_bits) - 3): break
-
-    if bit_idx <= len(data_bits) - 3:
-        c_img_0idx = 13 - 1
-        for y_mat_1idx in range(MODULES + 4, 13 - 1, -1):
-            r_img_0idx = y_mat_1idx - 1
-            if not encode_pixel_at(r_img_0idx, c_img_0idx): break
-
-    if bit_idx <= len(data_bits) - 3:
-        for x_mat_1idx in range(12, 5 - 1, -1):
-            c_img_0idx = x_mat_1idx - 1
-            for y_mat_1idx in range(MODULES - 5, 14 - 1, -1):
-                r_img_0idx = y_mat_1idx - 1
-                if not encode_pixel_at(r_img_0idx, c_img_0idx): break
-            if not (bit_idx <= len(data_bits) - 3): break
+    pixels_colored = min(len(symbols), len(placement_coords))
+    target = placement_coords[:pixels_colored]
+    image[target[:, 0], target[:, 1]] = _RS_COLOR_LUT[symbols[:pixels_colored]]
+    bit_idx = pixels_colored * 3
 
     if bit_idx < len(data_bits):
         logger.warning(f"RS data: {len(data_bits) - bit_idx} bits remaining after trying to place. Placed {pixels_colored} pixels.")
@@ -379,13 +388,6 @@ def place_rs_data(image, rs_data):
 
     total_image_pixels = image_width * image_height
     finder_pattern_pixels = 4 * (7 * 7)
-    bch_pixels = len(bch_coords_set)
-
-    potential_rs_pixels = 0
-    for r_idx in range(image_height):
-        for c_idx in range(image_width):
-            if is_valid_for_data(r_idx, c_idx, image_width, image_height) and (r_idx, c_idx) not in bch_coords_set:
-                potential_rs_pixels += 1
 
     available_rs_bits = potential_rs_pixels * 3
     actual_rs_bits_placed = bit_idx
@@ -414,11 +416,43 @@ def process_chunk(chunk_file, output_dir, scale_factor=10):
     return encode_chunk_to_c_COLOR(chunk_data, output_file, scale_factor)
 
 
+def _init_encode_worker():
+    get_rs_placement_map()
+    get_batch_rs_codec(n_sym_per_block, k_sym_per_block)
+
+
+def _encode_chunk_task(task):
+    chunk_path, output_dir, scale_factor = task
+    try:
+        return chunk_path, process_chunk(chunk_path, output_dir, scale_factor), None
+    except Exception as e:
+        return chunk_path, None, str(e)
+
+
+def encode_chunks_parallel(chunk_paths, output_dir, scale_factor=10, workers=None):
+    workers = workers or os.cpu_count() or 1
+    tasks = [(chunk_path, output_dir, scale_factor) for chunk_path in chunk_paths]
+    if not tasks:
+        return
+
+    tasks_per_submit = max(1, len(tasks) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_encode_worker) as executor:
+        yield from executor.map(_encode_chunk_task, tasks, chunksize=tasks_per_submit)
+
+
+def _worker_count(value):
+    workers = int(value)
+    if workers < 0:
+        raise argparse.ArgumentTypeError(f"worker count must be 0 or more, got {workers}")
+    return workers
+
+
 def main():
     parser = argparse.ArgumentParser(description='Encode file chunks to c_COLOR images.')
     parser.add_argument('--input', '-i', required=True, help='Input chunk file or directory')
     parser.add_argument('--output', '-o', required=True, help='Output directory for c_COLOR images')
     parser.add_argument('--scale', '-s', type=int, default=10, help='Scale factor for output images (default: 10)')
+    parser.add_argument('--workers', '-w', type=_worker_count, default=1, help='Worker processes for directory mode (default: 1, 0 = all CPUs)')
     args = parser.parse_args()
 
     if not os.path.exists(args.output):
@@ -434,10 +468,20 @@ def main():
     elif os.path.isdir(args.input):
         success_count = 0
         fail_count = 0
+        start_time = time.perf_counter()
 
-        for filename in os.listdir(args.input):
-            if filename.endswith('.bin'):
-                chunk_path = os.path.join(args.input, filename)
+        chunk_paths = [os.path.join(args.input, filename) for filename in os.listdir(args.input) if filename.endswith('.bin')]
+
+        if args.workers != 1:
+            for chunk_path, output_path, error in encode_chunks_parallel(chunk_paths, args.output, args.scale, args.workers):
+                if error is None:
+                    logger.info(f"Successfully encoded chunk to {output_path}")
+                    success_count += 1
+                else:
+                    logger.error(f"Error encoding chunk {chunk_path}: {error}")
+                    fail_count += 1
+        else:
+            for chunk_path in chunk_paths:
                 try:
                     output_path = process_chunk(chunk_path, args.output, args.scale)
                     logger.info(f"Successfully encoded chunk to {output_path}")
@@ -446,7 +490,9 @@ def main():
                     logger.error(f"Error encoding chunk {chunk_path}: {str(e)}", exc_info=True)
                     fail_count += 1
 
-        logger.info(f"Encoding complete: {success_count} chunks encoded, {fail_count} failed")
+        elapsed = time.perf_counter() - start_time
+        rate = (success_count + fail_count) / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Encoding complete: {success_count} chunks encoded, {fail_count} failed in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
         if fail_count > 0:
             return 1
     else:
@@ -457,4 +503,4 @@ def main():
 
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
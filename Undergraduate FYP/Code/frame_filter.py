@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+FINGERPRINT_SIZE = 50
+# Unrelated barcodes land about 2/sqrt(pi) ~ 1.13 apart once normalised.
+SAME_FRAME_DISTANCE = 0.4
+
+def frame_fingerprint(barcode):
+    thumb = cv2.resize(barcode, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    thumb -= thumb.mean(axis=(0, 1))
+    thumb /= thumb.std() + 1e-6
+
+    gray = cv2.cvtColor(barcode, cv2.COLOR_BGR2GRAY) if barcode.ndim == 3 else barcode
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    return thumb.ravel(), sharpness
+
+def fingerprint_distance(fingerprint_a, fingerprint_b):
+    return float(np.abs(fingerprint_a - fingerprint_b).mean())
+
+class FrameClusters:
+    def __init__(self, threshold=SAME_FRAME_DISTANCE):
+        self.threshold = threshold
+        self.clusters = []
+        self._leaders = None
+        self._last_cluster = None
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def match(self, fingerprint):
+        if self._last_cluster is not None and \
+                fingerprint_distance(self._leaders[self._last_cluster], fingerprint) < self.threshold:
+            return self._last_cluster
+        if not self.clusters:
+            return None
+        distances = np.abs(self._leaders[:len(self.clusters)] - fingerprint).mean(axis=1)
+        cluster_idx = int(np.argmin(distances))
+        return cluster_idx if distances[cluster_idx] < self.threshold else None
+
+    def add(self, fingerprint, quality, item):
+        cluster_idx = self.match(fingerprint)
+        if cluster_idx is None:
+            cluster_idx = len(self.clusters)
+            if self._leaders is None:
+                self._leaders = np.empty((16, fingerprint.size), dtype=np.float32)
+            elif cluster_idx == len(self._leaders):
+                self._leaders = np.concatenate((self._leaders, np.empty_like(self._leaders)))
+            self._leaders[cluster_idx] = fingerprint
+            self.clusters.append([])
+        self.clusters[cluster_idx].append((quality, item))
+        self._last_cluster = cluster_idx
+        return cluster_idx
+
+    def candidates(self, cluster_idx):
+        return [item for _, item in sorted(self.clusters[cluster_idx], key=lambda candidate: candidate[0], reverse=True)]
@@ -0,0 +1,236 @@
+import os
+import struct
+
+from common import sanitize_path
+
+MANIFEST_MAGIC = b'MFST'
+MANIFEST_VERSION = 2
+_SUPPORTED_MANIFEST_VERSIONS = (1, 2)
+MANIFEST_BLOCK_FILES = 256
+MANIFEST_DIGEST_LEN = 32
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_KEY_VERIFICATION = 0x02
+
+_MANIFEST_HEADER_STRUCT = struct.Struct('<4sBBd')
+_NO_DIGEST = bytes(MANIFEST_DIGEST_LEN)
+
+def _write_varint(out, value):
+    if value < 0:
+        raise ValueError(f"Cannot encode negative value {value} as varint")
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _write_string(out, text):
+    encoded = text.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _read_string(data, pos):
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode('utf-8'), pos + length
+
+def is_manifest(data):
+    return bytes(data[:len(MANIFEST_MAGIC)]) == MANIFEST_MAGIC
+
+def encode_manifest(metadata):
+    files = metadata['files']
+    flags = _FLAG_ENCRYPTED if metadata.get('encrypted') else 0
+    if metadata.get('key_verification'):
+        flags |= _FLAG_KEY_VERIFICATION
+
+    out = bytearray(_MANIFEST_HEADER_STRUCT.pack(MANIFEST_MAGIC, MANIFEST_VERSION, flags, metadata.get('created_time', 0.0)))
+    _write_varint(out, len(files))
+    _write_varint(out, sum(file_info['chunk_count'] for file_info in files))
+    if flags & _FLAG_KEY_VERIFICATION:
+        out += bytes.fromhex(metadata['key_verification'])
+    _write_string(out, metadata.get('base_directory', ''))
+
+    directories = {}
+    split_paths = []
+    for file_info in files:
+        directory, name = os.path.split(file_info.get('original_path', file_info['path']))
+        split_paths.append((directories.setdefault(directory, len(directories)), name))
+    _write_varint(out, len(directories))
+    for directory in directories:
+        _write_string(out, directory)
+
+    for block_start in range(0, len(files), MANIFEST_BLOCK_FILES):
+        block_files = files[block_start:block_start + MANIFEST_BLOCK_FILES]
+        block_paths = split_paths[block_start:block_start + MANIFEST_BLOCK_FILES]
+        block = bytearray()
+        for directory_idx, _ in block_paths:
+            _write_varint(block, directory_idx)
+        for _, name in block_paths:
+            _write_string(block, name)
+        for file_info in block_files:
+            _write_varint(block, file_info['size'])
+        for file_info in block_files:
+            _write_varint(block, file_info['chunk_count'])
+        for file_info in block_files:
+            block += bytes.fromhex(file_info['checksum']) if file_info.get('checksum') else _NO_DIGEST
+        for file_info in block_files:
+            _write_varint(block, len(file_info.get('blocks') or ()))
+        for file_info in block_files:
+            for block_chunk_count, block_raw_size in file_info.get('blocks') or ():
+                _write_varint(block, block_chunk_count)
+                _write_varint(block, block_raw_size)
+        _write_varint(out, len(block_files))
+        _write_varint(out, len(block))
+        out += block
+    return bytes(out)
+
+class ManifestReader:
+    def __init__(self, parts, sequence_base=0, total_chunks=None):
+        self._parts = iter(parts)
+        self._buffer = bytearray()
+        self._pos = 0
+        self.sequence_base = sequence_base
+        self.total_chunks = total_chunks
+
+        magic, version, flags, self.created_time = _MANIFEST_HEADER_STRUCT.unpack(self._read(_MANIFEST_HEADER_STRUCT.size))
+        if magic != MANIFEST_MAGIC:
+            raise ValueError("Invalid manifest: magic word 'MFST' not found.")
+        if version not in _SUPPORTED_MANIFEST_VERSIONS:
+            raise ValueError(f"Unsupported manifest version: {version}. Expected one of {_SUPPORTED_MANIFEST_VERSIONS}.")
+        self.version = version
+        self.encrypted = bool(flags & _FLAG_ENCRYPTED)
+        self.file_count = self._read_varint()
+        self.total_data_chunks = self._read_varint()
+        self.key_verification = self._read(MANIFEST_DIGEST_LEN).hex() if flags & _FLAG_KEY_VERIFICATION else None
+        self.base_directory = self._read_string()
+        self.directories = [self._read_string() for _ in range(self._read_varint())]
+
+    def _fill(self, size):
+        while len(self._buffer) - self._pos < size:
+            part = next(self._parts, None)
+            if part is None:
+                raise ValueError("Truncated manifest")
+            if self._pos:
+                del self._buffer[:self._pos]
+                self._pos = 0
+            self._buffer += part
+
+    def _read(self, size):
+        self._fill(size)
+        data = bytes(self._buffer[self._pos:self._pos + size])
+        self._pos += size
+        return data
+
+    def _read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            byte = self._read(1)[0]
+            result |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def _read_string(self):
+        return self._read(self._read_varint()).decode('utf-8')
+
+    def iter_files(self):
+        files_read = 0
+        next_sequence = self.sequence_base
+        while files_read < self.file_count:
+            block_count = self._read_varint()
+            block = self._read(self._read_varint())
+            pos = 0
+            directory_indices = []
+            for _ in range(block_count):
+                directory_idx, pos = _read_varint(block, pos)
+                directory_indices.append(directory_idx)
+            names = []
+            for _ in range(block_count):
+                name, pos = _read_string(block, pos)
+                names.append(name)
+            sizes = []
+            for _ in range(block_count):
+                size, pos = _read_varint(block, pos)
+                sizes.append(size)
+            chunk_counts = []
+            for _ in range(block_count):
+                chunk_count, pos = _read_varint(block, pos)
+                chunk_counts.append(chunk_count)
+            digests = []
+            for _ in range(block_count):
+                digests.append(block[pos:pos + MANIFEST_DIGEST_LEN])
+                pos += MANIFEST_DIGEST_LEN
+            compression_blocks = [[] for _ in range(block_count)]
+            if self.version >= 2:
+                compression_block_counts = []
+                for _ in range(block_count):
+                    compression_block_count, pos = _read_varint(block, pos)
+                    compression_block_counts.append(compression_block_count)
+                for i in range(block_count):
+                    for _ in range(compression_block_counts[i]):
+                        block_chunk_count, pos = _read_varint(block, pos)
+                        block_raw_size, pos = _read_varint(block, pos)
+                        compression_blocks[i].append((block_chunk_count, block_raw_size))
+            for i in range(block_count):
+                directory = self.directories[directory_indices[i]]
+                original_path = os.path.join(directory, names[i]) if directory else names[i]
+                file_info = {
+                    "path": sanitize_path(original_path),
+                    "size": sizes[i],
+                    "start_sequence": next_sequence,
+                    "chunk_count": chunk_counts[i],
+                    "checksum": digests[i].hex() if digests[i] != _NO_DIGEST else "",
+                    "original_path": original_path,
+                    "total_chunks": self.total_chunks
+                }
+                if compression_blocks[i]:
+                    file_info["blocks"] = compression_blocks[i]
+                yield file_info
+                next_sequence += chunk_counts[i]
+            files_read += block_count
+
+    def metadata(self):
+        metadata = {
+            "files": ManifestFiles(self),
+            "total_files": self.file_count,
+            "total_data_chunks": self.total_data_chunks,
+            "base_directory": self.base_directory,
+            "encrypted": self.encrypted,
+            "created_time": self.created_time,
+            "format_version": f"manifest-{self.version}"
+        }
+        if self.total_chunks is not None:
+            metadata["total_chunks"] = self.total_chunks
+        if self.key_verification:
+            metadata["key_verification"] = self.key_verification
+        return metadata
+
+class ManifestFiles:
+    def __init__(self, reader):
+        self._reader = reader
+        self._files = reader.iter_files()
+        self._decoded = []
+
+    def __len__(self):
+        return self._reader.file_count
+
+    def __iter__(self):
+        idx = 0
+        while True:
+            if idx == len(self._decoded):
+                file_info = next(self._files, None)
+                if file_info is None:
+                    return
+                self._decoded.append(file_info)
+            yield self._decoded[idx]
+            idx += 1
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import os
+import queue
+import threading
+import argparse
+import logging
+import cv2
+
+import send
+import encode
+import decode
+import receive
+from common import _CHUNK_FULL_HEADER_LEN
+
+STAGE_QUEUE_SIZE = 32
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_STAGE_END = object()
+
+class StageCancelled(Exception):
+    pass
+
+class _StageFailure:
+    def __init__(self, error):
+        self.error = error
+
+def threaded_stage(produce, maxsize=STAGE_QUEUE_SIZE):
+    stage_queue = queue.Queue(maxsize=maxsize)
+    stop_event = threading.Event()
+
+    def emit(item):
+        while True:
+            if stop_event.is_set():
+                raise StageCancelled()
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            produce(emit, stop_event.is_set)
+            final_item = _STAGE_END
+        except StageCancelled:
+            return
+        except Exception as e:
+            final_item = _StageFailure(e)
+        try:
+            emit(final_item)
+        except StageCancelled:
+            pass
+
+    producer = threading.Thread(target=run, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = stage_queue.get()
+            if item is _STAGE_END:
+                break
+            if isinstance(item, _StageFailure):
+                raise item.error
+            yield item
+    finally:
+        stop_event.set()
+
+def buffered_stage(items, maxsize=STAGE_QUEUE_SIZE):
+    def produce(emit, cancel_check):
+        for item in items:
+            emit(item)
+    return threaded_stage(produce, maxsize)
+
+def chunk_stage(files, encrypt=True, key_string="", base_dir=None, status_callback=None, maxsize=STAGE_QUEUE_SIZE):
+    def produce(emit, cancel_check):
+        def chunk_sink(chunk_name, chunk_bytes):
+            emit((chunk_name, chunk_bytes))
+            return chunk_name
+
+        send.process_files(
+            files=files,
+            output_dir=None,
+            encrypt=encrypt,
+            key_string=key_string,
+            status_callback=status_callback,
+            explicit_base_for_rel_paths=base_dir,
+            chunk_sink=chunk_sink,
+            cancel_check=cancel_check
+        )
+    return threaded_stage(produce, maxsize)
+
+def encode_stage(chunks, scale_factor=10):
+    for chunk_name, chunk_bytes in chunks:
+        header = bytes(chunk_bytes[:_CHUNK_FULL_HEADER_LEN])
+        payload = bytes(chunk_bytes[_CHUNK_FULL_HEADER_LEN:])
+        yield os.path.splitext(chunk_name)[0], header, encode.encode_chunk_to_frame(payload, scale_factor)
+
+def frame_sink_stage(frames, spill_dir=None):
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    for frame_name, header, frame in frames:
+        if spill_dir:
+            cv2.imwrite(os.path.join(spill_dir, f"{frame_name}.png"), frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
+        yield frame_name, header, frame
+
+def frame_source_stage(image_dir, header_dir):
+    image_paths = [os.path.join(image_dir, f) for f in os.listdir(image_dir)
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+    for image_path in sorted(image_paths, key=decode.image_sequence_key):
+        frame_name = os.path.splitext(os.path.basename(image_path))[0]
+        header_path = os.path.join(header_dir, f"{frame_name}.bin")
+        if not os.path.exists(header_path):
+            logger.error(f"No sender chunk {header_path} to take the header from for {image_path}. Skipping.")
+            continue
+        with open(header_path, 'rb') as f:
+            header = f.read(_CHUNK_FULL_HEADER_LEN)
+        frame = cv2.imread(image_path)
+        if frame is None:
+            logger.error(f"Could not read image: {image_path}. Skipping.")
+            continue
+        yield frame_name, header, frame
+
+def decode_stage(frames, status_callback=None):
+    for frame_name, header, frame in frames:
+        try:
+            payload = decode.decode_c_COLOR_payload_from_frame(frame, frame_name)
+        except Exception as e:
+            payload = None
+            if status_callback:
+                status_callback(f"Error decoding frame {frame_name}: {e}")
+        if payload is None:
+            continue
+        yield f"{frame_name}.bin", header + payload
+
+def reassemble_stage(chunks, output_dir, encrypt=True, key_string="", spill_dir=None,
+                     progress_callback=None, status_callback=None, force=False):
+    if not spill_dir:
+        return stream_reassemble_stage(chunks, output_dir, encrypt, key_string,
+                                       progress_callback, status_callback, force)
+
+    chunk_sources = []
+    os.makedirs(spill_dir, exist_ok=True)
+    for chunk_name, chunk_bytes in chunks:
+        chunk_path = os.path.join(spill_dir, chunk_name)
+        with open(chunk_path, 'wb') as f:
+            f.write(chunk_bytes)
+        chunk_sources.append(chunk_path)
+
+    if not chunk_sources:
+        if status_callback:
+            status_callback("No chunks reached the reassembly stage")
+        return False
+
+    return receive.reassemble_files(
+        chunk_sources, output_dir, encrypt, key_string,
+        progress_callback=progress_callback, status_callback=status_callback, force=force
+    )
+
+def stream_reassemble_stage(chunks, output_dir, encrypt=True, key_string="",
+                            progress_callback=None, status_callback=None, force=False):
+    with receive.StreamingReassembler(output_dir, encrypt, key_string, progress_callback,
+                                      status_callback, force) as reassembler:
+        for _, chunk_bytes in chunks:
+            reassembler.feed(chunk_bytes)
+            if reassembler.complete:
+                break
+        return reassembler.close()
+
+def run_loopback(files, output_dir, encrypt=True, key_string="", base_dir=None, scale_factor=10,
+                 frame_spill_dir=None, chunk_spill_dir=None, status_callback=None, force=False):
+    chunks = chunk_stage(files, encrypt, key_string, base_dir, status_callback)
+    frames = buffered_stage(encode_stage(chunks, scale_factor))
+    frames = frame_sink_stage(frames, frame_spill_dir)
+    decoded_chunks = buffered_stage(decode_stage(frames, status_callback))
+    return reassemble_stage(decoded_chunks, output_dir, encrypt, key_string, chunk_spill_dir,
+                            status_callback=status_callback, force=force)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the send -> encode -> decode -> receive chain in memory.')
+    parser.add_argument('--input', '-i', required=True, help='Input file or directory to transfer')
+    parser.add_argument('--output', '-o', required=True, help='Output directory for reassembled files')
+    parser.add_argument('--key', '-k', default="", help='Encryption key (omit to disable encryption)')
+    parser.add_argument('--scale', '-s', type=int, default=10, help='Scale factor for frames (default: 10)')
+    parser.add_argument('--frame-spill-dir', help='Also write every encoded frame as a PNG into this directory')
+    parser.add_argument('--chunk-spill-dir', help='Write decoded chunks to this directory instead of keeping them in memory')
+    parser.add_argument('--force', '-f', action='store_true', help='Overwrite a non-empty output directory')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.input):
+        base_dir = args.input
+        files = [os.path.join(root, name) for root, _, names in os.walk(args.input) for name in names]
+    elif os.path.isfile(args.input):
+        base_dir = None
+        files = [args.input]
+    else:
+        logger.error(f"Input path {args.input} is not a file or directory")
+        return 1
+
+    ok = run_loopback(files, args.output, encrypt=bool(args.key), key_string=args.key, base_dir=base_dir,
+                      scale_factor=args.scale, frame_spill_dir=args.frame_spill_dir,
+                      chunk_spill_dir=args.chunk_spill_dir, status_callback=logger.info, force=args.force)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    exit(main())
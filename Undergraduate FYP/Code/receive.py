@@ -4,125 +4,186 @@ import zlib
 import concurrent.futures
 import pickle
 import re
-import sqlite3
 import gc
 import time
 import hashlib
+import itertools
+import collections
+import threading
 import struct
+import numpy as np
 from pathlib import Path
 
 from common import (
     CHUNK_SIZE, prepare_output_directory, string_to_key, xor_crypt_chunk,
     calculate_checksum, sanitize_path, get_optimal_buffer_size,
-    get_optimal_thread_count, parse_chunk_header
+    get_optimal_thread_count, parse_chunk_header,
+    METADATA_PREFIX_MAGIC, METADATA_PREFIX_STRUCT
 )
+from chunk_pack import ChunkPackReader, is_chunk_pack
+from manifest import ManifestReader, is_manifest, MANIFEST_MAGIC
 
-def setup_optimized_sqlite_connection():
+def is_memory_chunk(chunk_source):
+    return isinstance(chunk_source, (bytes, bytearray, memoryview))
+
+def chunk_source_name(chunk_source):
+    if is_memory_chunk(chunk_source):
+        return f"<in-memory chunk, {len(chunk_source)} bytes>"
+    return os.path.basename(chunk_source)
+
+def open_chunk_sources(chunk_files, pack_readers, status_callback=None):
+    chunk_sources = []
+    for chunk_file in chunk_files:
+        if is_memory_chunk(chunk_file) or not is_chunk_pack(chunk_file):
+            chunk_sources.append(chunk_file)
+            continue
+        reader = ChunkPackReader(chunk_file)
+        pack_readers.append(reader)
+        chunk_sources.extend(reader.chunks(status_callback=status_callback))
+        if status_callback:
+            status_callback(f"Opened chunk pack {os.path.basename(chunk_file)} with {len(reader)} chunks")
+    return chunk_sources
+
+def read_chunk_header(chunk_source):
+    if is_memory_chunk(chunk_source):
+        return bytes(chunk_source[:26])
+    with open(chunk_source, 'rb') as f:
+        return f.read(26)
+
+CHUNK_NAME_PATTERN = re.compile(r'([MC])_(\d+)_(\d+)\.bin')
+HEADER_SCAN_BATCH = 256
+HEADER_SCAN_THREADS = min(16, (os.cpu_count() or 1) * 4)
+
+def parse_chunk_name(chunk_source):
+    if is_memory_chunk(chunk_source):
+        return None
+    match = CHUNK_NAME_PATTERN.fullmatch(os.path.basename(chunk_source))
+    if not match:
+        return None
+    return {
+        'is_metadata': match.group(1) == 'M',
+        'sequence_number': int(match.group(2)),
+        'total_count': int(match.group(3))
+    }
+
+def _read_header_at(chunk_path):
+    fd = os.open(chunk_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
     try:
-        db_conn = sqlite3.connect('file:memdb1?mode=memory&cache=shared', uri=True)
-    except sqlite3.OperationalError:
-        db_conn = sqlite3.connect(':memory:')
-    
-    db_conn.execute("PRAGMA journal_mode = OFF")
-    db_conn.execute("PRAGMA synchronous = OFF")
-    db_conn.execute("PRAGMA cache_size = 200000")
-    db_conn.execute("PRAGMA temp_store = MEMORY")
-    db_conn.execute("PRAGMA page_size = 32768")
-    
-    if ':memory:' not in str(db_conn):
+        if hasattr(os, 'pread'):
+            return os.pread(fd, 26, 0)
+        return os.read(fd, 26)
+    finally:
+        os.close(fd)
+
+def read_chunk_headers(chunk_paths):
+    headers = []
+    for chunk_path in chunk_paths:
         try:
-            db_conn.execute("PRAGMA journal_mode = WAL")
-        except sqlite3.OperationalError:
-            pass
+            headers.append((_read_header_at(chunk_path), None))
+        except OSError as e:
+            headers.append((None, e))
+    return headers
+
+CHUNK_SLOT_SIZE = 26 + CHUNK_SIZE
+CHUNK_RUN_SIZE = 16
+_WRITE_AT_LOCK = threading.Lock()
+CHUNK_WINDOW_PER_THREAD = 4
+
+def _buffer_view(buffer, size):
+    if buffer is None or len(buffer) < size:
+        return memoryview(bytearray(size))
+    return memoryview(buffer)[:size]
+
+def _decrypt_and_verify_chunk(chunk_file, header_info, payload, encrypt, key, status_callback=None, out=None):
+    is_metadata = header_info['is_metadata']
+    sequence_number = header_info['sequence_number']
+    total_count = header_info['total_count']
+    is_encrypted = header_info['is_encrypted']
+    chunk_checksum = header_info['checksum']
     
-    try:
-        db_conn.execute("PRAGMA mmap_size = 536870912")
-    except sqlite3.OperationalError:
-        pass
+    if is_encrypted and encrypt:
+        if not key:
+            raise ValueError("Decryption key cannot be empty")
+        data = xor_crypt_chunk(payload, key, offset=sequence_number * len(payload),
+                               out=out if out is not None else _buffer_view(None, len(payload)))
+    else:
+        data = payload
+    
+    if not header_info['is_metadata'] and not data and status_callback:
+        status_callback(
+            f"DIAGNOSTIC: Chunk {chunk_source_name(chunk_file)} (seq={header_info['sequence_number']}) " +
+            f"is a DATA chunk but has an EMPTY payload after potential decryption. " +
+            f"Header checksum from chunk: {header_info['checksum'].hex()}. " +
+            f"This chunk might contribute to a 0-byte file if its checksum validates an empty payload."
+        )
+
+    calculated_checksum = calculate_checksum(data).encode('utf-8')[:8]
+    if calculated_checksum != header_info['checksum']:
+        error_message = (
+            f"Checksum verification FAILED for chunk {chunk_source_name(chunk_file)}. " +
+            f"Expected (from header): {header_info['checksum'].hex()}, " +
+            f"Calculated (from payload): {calculated_checksum.hex()}. " +
+            f"Payload length: {len(data)}. Sequence: {header_info['sequence_number']}."
+        )
+        if status_callback:
+            status_callback(error_message)
+        raise ValueError(error_message)
     
-    return db_conn
+    return {
+        'sequenceNumber': sequence_number, 
+        'totalCount': total_count,
+        'isMetadata': is_metadata
+    }, data
 
-def process_chunk_file(chunk_file, encrypt=True, key_string="", status_callback=None):
+def process_chunk_file(chunk_file, encrypt=True, key_string="", status_callback=None, buffer=None):
     try:
+        key = string_to_key(key_string) if encrypt else None
+
+        if is_memory_chunk(chunk_file):
+            chunk_view = memoryview(chunk_file)
+            header_info = parse_chunk_header(bytes(chunk_view[:26]))
+            payload = chunk_view[26:]
+            return _decrypt_and_verify_chunk(chunk_file, header_info, payload, encrypt, key, status_callback,
+                                             out=_buffer_view(buffer, len(payload)))
+
         if not os.path.exists(chunk_file):
             raise FileNotFoundError(f"Chunk file not found: {chunk_file}")
         
-        file_size = os.path.getsize(chunk_file)
-        
-        key = string_to_key(key_string) if encrypt else None
-        
-        if file_size > 65536:
-            with open(chunk_file, 'rb') as f:
-                header_data = f.read(26)
-                
-                header_info = parse_chunk_header(header_data)
-                
-                payload = f.read(file_size - 26)
-        else:
-            with open(chunk_file, 'rb') as f:
-                data = f.read()
-                
-            header_data = data[:26]
-            header_info = parse_chunk_header(header_data)
-            payload = data[26:]
-            data = None
-        
-        is_metadata = header_info['is_metadata']
-        sequence_number = header_info['sequence_number']
-        total_count = header_info['total_count']
-        is_encrypted = header_info['is_encrypted']
-        chunk_checksum = header_info['checksum']
-        
-        if is_encrypted and encrypt:
-            if not key:
-                raise ValueError("Decryption key cannot be empty")
-            data = xor_crypt_chunk(payload, key, offset=sequence_number * len(payload))
-        else:
-            data = payload
-        
-        if not header_info['is_metadata'] and not data and status_callback:
-            status_callback(
-                f"DIAGNOSTIC: Chunk {os.path.basename(chunk_file)} (seq={header_info['sequence_number']}) " +
-                f"is a DATA chunk but has an EMPTY payload after potential decryption. " +
-                f"Header checksum from chunk: {header_info['checksum'].hex()}. " +
-                f"This chunk might contribute to a 0-byte file if its checksum validates an empty payload."
-            )
+        with open(chunk_file, 'rb', buffering=0) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            chunk_view = _buffer_view(buffer, file_size)
+            bytes_read = f.readinto(chunk_view)
+        chunk_view = chunk_view[:bytes_read]
 
-        calculated_checksum = calculate_checksum(data).encode('utf-8')[:8]
-        if calculated_checksum != header_info['checksum']:
-            error_message = (
-                f"Checksum verification FAILED for chunk {os.path.basename(chunk_file)}. " +
-                f"Expected (from header): {header_info['checksum'].hex()}, " +
-                f"Calculated (from payload): {calculated_checksum.hex()}. " +
-                f"Payload length: {len(data)}. Sequence: {header_info['sequence_number']}."
+        header_info = parse_chunk_header(bytes(chunk_view[:26]))
+        name_info = parse_chunk_name(chunk_file)
+        if name_info and any(name_info[field] != header_info[field] for field in name_info):
+            raise ValueError(
+                f"Chunk name does not match its header (header says " +
+                f"{'M' if header_info['is_metadata'] else 'C'}_{header_info['sequence_number']}_{header_info['total_count']})"
             )
-            if status_callback:
-                status_callback(error_message)
-            raise ValueError(error_message)
-        
-        return {
-            'sequenceNumber': sequence_number, 
-            'totalCount': total_count,
-            'isMetadata': is_metadata
-        }, data
+        payload = chunk_view[26:]
+
+        return _decrypt_and_verify_chunk(chunk_file, header_info, payload, encrypt, key, status_callback, out=payload)
             
     except Exception as e:
         if status_callback:
-            status_callback(f"Error processing chunk {os.path.basename(chunk_file)}: {str(e)}")
+            status_callback(f"Error processing chunk {chunk_source_name(chunk_file)}: {str(e)}")
         raise
 
-def process_chunks_batch(chunk_files, encrypt, key_string, status_callback=None):
+def process_chunks_batch(chunk_files, encrypt, key_string, status_callback=None, buffer=None):
     results = []
     errors = []
     
-    for chunk_path in chunk_files:
+    for slot_idx, chunk_path in enumerate(chunk_files):
         try:
-            metadata, data = process_chunk_file(chunk_path, encrypt, key_string)
+            slot = memoryview(buffer)[slot_idx * CHUNK_SLOT_SIZE:(slot_idx + 1) * CHUNK_SLOT_SIZE] if buffer is not None else None
+            metadata, data = process_chunk_file(chunk_path, encrypt, key_string, buffer=slot)
             results.append((chunk_path, metadata, data))
         except Exception as e:
             errors.append((chunk_path, str(e)))
             if status_callback:
-                status_callback(f"Error processing chunk {os.path.basename(chunk_path)}: {str(e)}")
+                status_callback(f"Error processing chunk {chunk_source_name(chunk_path)}: {str(e)}")
     
     return results, errors
 
@@ -138,8 +199,7 @@ def extract_metadata_from_files(metadata_files, encrypt, key_string, status_call
     
     def get_seq_from_header(file_path):
         try:
-            with open(file_path, 'rb') as f:
-                header = f.read(26)
+            header = read_chunk_header(file_path)
             header_info = parse_chunk_header(header)
             return header_info['sequence_number']
         except Exception:
@@ -183,13 +243,13 @@ def extract_metadata_from_files(metadata_files, encrypt, key_string, status_call
             except Exception as e:
                 errors.append((file_path, str(e)))
                 if status_callback:
-                    status_callback(f"Warning: Failed to process metadata chunk {os.path.basename(file_path)}: {str(e)}")
+                    status_callback(f"Warning: Failed to process metadata chunk {chunk_source_name(file_path)}: {str(e)}")
     
     if not metadata_chunks:
         error_msg = "No metadata could be processed"
         if errors:
             try:
-                file_name = os.path.basename(errors[0][0]) if isinstance(errors[0][0], str) else "Unknown"
+                file_name = chunk_source_name(errors[0][0])
                 error_msg += f". First error: {file_name}: {errors[0][1]}"
             except Exception:
                 error_msg += f". Errors occurred but details could not be retrieved"
@@ -198,18 +258,35 @@ def extract_metadata_from_files(metadata_files, encrypt, key_string, status_call
     metadata_chunks.sort(key=lambda x: x[0]['sequenceNumber'])
     
     try:
+        metadata_prefix = None
+        first_chunk_metadata, first_chunk_data = metadata_chunks[0]
+        if bytes(first_chunk_data[:len(METADATA_PREFIX_MAGIC)]) == METADATA_PREFIX_MAGIC:
+            metadata_prefix = METADATA_PREFIX_STRUCT.unpack_from(first_chunk_data)
+            metadata_chunks[0] = (first_chunk_metadata, first_chunk_data[METADATA_PREFIX_STRUCT.size:])
+        
         decompressor = zlib.decompressobj()
-        decompressed_data = bytearray()
         
-        for _, chunk_data in metadata_chunks:
-            decompressed_chunk = decompressor.decompress(chunk_data)
-            decompressed_data.extend(decompressed_chunk)
+        def decompressed_parts():
+            for _, chunk_data in metadata_chunks:
+                decompressed_chunk = decompressor.decompress(chunk_data)
+                if decompressed_chunk:
+                    yield decompressed_chunk
+            final_data = decompressor.flush()
+            if final_data:
+                yield final_data
         
-        final_data = decompressor.flush()
-        if final_data:
-            decompressed_data.extend(final_data)
-            
-        metadata = pickle.loads(bytes(decompressed_data))
+        parts = decompressed_parts()
+        head = b''
+        for part in parts:
+            head += part
+            if len(head) >= len(MANIFEST_MAGIC):
+                break
+        
+        if is_manifest(head):
+            sequence_base, total_chunks = (metadata_prefix[1], metadata_prefix[2]) if metadata_prefix else (0, None)
+            return ManifestReader(itertools.chain([head], parts), sequence_base, total_chunks).metadata()
+        
+        metadata = pickle.loads(head + b''.join(parts))
         
         if not isinstance(metadata, dict) or 'files' not in metadata:
             raise ValueError("Invalid metadata format: missing required fields")
@@ -218,6 +295,13 @@ def extract_metadata_from_files(metadata_files, encrypt, key_string, status_call
             if 'path' not in file_info or 'start_sequence' not in file_info or 'chunk_count' not in file_info:
                 raise ValueError("Invalid file metadata: missing required fields")
         
+        if metadata_prefix:
+            _, metadata_chunks_count, total_chunks = metadata_prefix
+            metadata['total_chunks'] = total_chunks
+            for file_info in metadata['files']:
+                file_info['start_sequence'] += metadata_chunks_count
+                file_info['total_chunks'] = total_chunks
+        
         return metadata
     except zlib.error as e:
         if status_callback:
@@ -234,7 +318,7 @@ def extract_metadata_from_files(metadata_files, encrypt, key_string, status_call
 
 def process_chunks_streaming(chunk_files, output_path, encrypt, key_string, 
                            status_callback=None, cancel_check=None, 
-                           progress_callback=None, progress_range=(0, 100)):
+                           progress_callback=None, progress_range=(0, 100), hasher=None):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
     buffer_size = get_optimal_buffer_size()
@@ -250,17 +334,6 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
             
         estimated_total_size = total_chunks * CHUNK_SIZE
         
-        if total_chunks <= 50:
-            batch_size = total_chunks
-        elif total_chunks <= 500:
-            batch_size = 50
-        elif total_chunks <= 5000:
-            batch_size = 100
-        else:
-            batch_size = 200
-    
-        total_batches = (total_chunks + batch_size - 1) // batch_size
-        
         if total_chunks <= 10:
             thread_count = 1
         elif total_chunks <= 100 or estimated_total_size < 5 * 1024 * 1024:
@@ -268,9 +341,15 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
         else:
             thread_count = get_optimal_thread_count(total_items=total_chunks, file_size=estimated_total_size)
         
+        run_size = min(CHUNK_RUN_SIZE, max(1, total_chunks // thread_count))
+        total_runs = (total_chunks + run_size - 1) // run_size
+        window_size = min(total_runs, thread_count * CHUNK_WINDOW_PER_THREAD)
+        
         start_progress, end_progress = progress_range
         
         def extract_seq_from_filename(filename):
+            if is_memory_chunk(filename):
+                return None
             try:
                 parts = os.path.basename(filename).split('_')
                 if len(parts) >= 2:
@@ -285,9 +364,7 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
                 return seq
                 
             try:
-                with open(chunk_path, 'rb') as f:
-                    header = f.read(26)
-                header_info = parse_chunk_header(header)
+                header_info = parse_chunk_header(read_chunk_header(chunk_path))
                 return header_info['sequence_number']
             except Exception:
                 return float('inf')
@@ -326,103 +403,78 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
         elif estimated_total_size > 100 * 1024 * 1024:
             update_frequency = 1.0
         
-        def update_progress(batch_idx, batch_processed_count=0, force=False):
+        def update_progress(force=False):
             nonlocal last_progress_update_time
             current_time = time.time()
             
             if force or (current_time - last_progress_update_time >= update_frequency):
                 last_progress_update_time = current_time
                 
-                total_processed = processed_chunks_count + batch_processed_count
-                progress_pct = start_progress + ((total_processed / total_chunks) * (end_progress - start_progress))
+                progress_pct = start_progress + ((processed_chunks_count / total_chunks) * (end_progress - start_progress))
                 
                 if progress_callback:
-                    progress_callback(f"Processing chunks: {total_processed}/{total_chunks}", progress_pct)
+                    progress_callback(f"Processing chunks: {processed_chunks_count}/{total_chunks}", progress_pct)
+        
+        chunk_buffer = bytearray(window_size * run_size * CHUNK_SLOT_SIZE)
+        chunk_buffer_view = memoryview(chunk_buffer)
         
-        with open(output_path, 'wb', buffering=buffer_size) as output_file:
+        def decrypt_run(run_idx):
+            run_start = run_idx * run_size
+            run_files = chunk_files[run_start:run_start + run_size]
+            slot_start = (run_idx % window_size) * run_size * CHUNK_SLOT_SIZE
+            return process_chunks_batch(run_files, encrypt, key_string, None,
+                                        chunk_buffer_view[slot_start:slot_start + len(run_files) * CHUNK_SLOT_SIZE])
+        
+        with open(output_path, 'wb', buffering=buffer_size) as output_file, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
             decompressor = zlib.decompressobj()
+            reorder_window = collections.deque()
+            next_run_idx = 0
             
-            for batch_idx in range(total_batches):
+            while next_run_idx < total_runs or reorder_window:
+                while next_run_idx < total_runs and len(reorder_window) < window_size:
+                    reorder_window.append((next_run_idx, executor.submit(decrypt_run, next_run_idx)))
+                    next_run_idx += 1
+                
                 if cancel_check and cancel_check():
+                    for _, future in reorder_window:
+                        future.cancel()
                     if status_callback:
                         status_callback("Operation cancelled")
                     return False
                 
-                start_idx = batch_idx * batch_size
-                end_idx = min((batch_idx + 1) * batch_size, total_chunks)
-                current_batch = chunk_files[start_idx:end_idx]
+                run_idx, future = reorder_window.popleft()
+                try:
+                    results, errors = future.result()
+                except Exception as e:
+                    if status_callback:
+                        status_callback(f"Error processing chunks {run_idx * run_size}-{(run_idx + 1) * run_size - 1}: {str(e)}")
+                    continue
+                for chunk_path, error in errors:
+                    if status_callback:
+                        status_callback(f"Error processing chunk {chunk_source_name(chunk_path)}: {error}")
                 
-                if thread_count > 1 and len(current_batch) > 3:
-                    chunk_results = []
-                    sub_batch_size = max(1, len(current_batch) // thread_count)
+                for _, metadata, chunk_data in results:
+                    if status_callback and detailed_logging_active:
+                        status_callback(f"Decompressing chunk seq: {metadata['sequenceNumber']}, input data length: {len(chunk_data)}, first 10 input bytes: {chunk_data[:10].hex() if chunk_data else 'EMPTY_INPUT'}")
                     
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
-                        futures = []
-                        for sub_batch_start in range(0, len(current_batch), sub_batch_size):
-                            sub_batch_end = min(sub_batch_start + sub_batch_size, len(current_batch))
-                            sub_batch = current_batch[sub_batch_start:sub_batch_end]
-                            
-                            future = executor.submit(process_chunks_batch, sub_batch, encrypt, key_string, None)
-                            futures.append((future, sub_batch_start))
-                        
-                        for future, sub_idx in futures:
-                            try:
-                                results, errors = future.result()
-                                if errors and status_callback:
-                                    status_callback(f"Batch {batch_idx}, sub-batch starting {sub_idx}: encountered {len(errors)} errors during chunk processing.")
-                                
-                                results.sort(key=lambda x: x[1]['sequenceNumber'])
-                                
-                                for chunk_path_processed, metadata, chunk_data in results:
-                                    if status_callback and detailed_logging_active:
-                                        status_callback(f"Decompressing chunk (batch {batch_idx}, sub {sub_idx}) seq: {metadata['sequenceNumber']}, input data length: {len(chunk_data)}, first 10 input bytes: {chunk_data[:10].hex() if chunk_data else 'EMPTY_INPUT'}")
-                                    
-                                    decompressed_data = decompressor.decompress(chunk_data)
-                                    
-                                    if status_callback and detailed_logging_active:
-                                        status_callback(f"Decompressed chunk (batch {batch_idx}, sub {sub_idx}) seq: {metadata['sequenceNumber']}, output data length: {len(decompressed_data)}, first 10 output bytes: {decompressed_data[:10].hex() if decompressed_data else 'EMPTY_OUTPUT'}")
-
-                                    bytes_written = output_file.write(decompressed_data)
-                                    
-                                    if status_callback and detailed_logging_active:
-                                        status_callback(f"Wrote {bytes_written} decompressed bytes for seq {metadata['sequenceNumber']} to {output_path}. Decompressed size: {len(decompressed_data)}")
-                                    
-                                    chunk_data = None 
-                                    decompressed_data = None
-                                    processed_chunks_count +=1
-                                    
-                            except Exception as e:
-                                if status_callback:
-                                    status_callback(f"Error processing sub-batch {sub_idx} in batch {batch_idx}: {str(e)}")
-                        update_progress(batch_idx, force=True)
-                else:
-                    for chunk_path in current_batch:
-                        if cancel_check and cancel_check():
-                            if status_callback: status_callback("Operation cancelled")
-                            return False
-                        try:
-                            metadata, data = process_chunk_file(chunk_path, encrypt, key_string)
-                            if status_callback and detailed_logging_active:
-                                status_callback(f"Decompressing chunk (single-thread) seq: {metadata['sequenceNumber']}, input data length: {len(data)}, first 10 input bytes: {data[:10].hex() if data else 'EMPTY_INPUT'}")
-                            
-                            decompressed_data = decompressor.decompress(data)
-
-                            if status_callback and detailed_logging_active:
-                                status_callback(f"Decompressed chunk (single-thread) seq: {metadata['sequenceNumber']}, output data length: {len(decompressed_data)}, first 10 output bytes: {decompressed_data[:10].hex() if decompressed_data else 'EMPTY_OUTPUT'}")
-
-                            bytes_written = output_file.write(decompressed_data)
-                            if status_callback and detailed_logging_active:
-                                status_callback(f"Wrote {bytes_written} decompressed bytes (single-thread) for seq {metadata['sequenceNumber']} to {output_path}. Decompressed size: {len(decompressed_data)}")
-
-                            data = None 
-                            decompressed_data = None
-                            processed_chunks_count += 1
-                            update_progress(batch_idx, batch_processed_count= (processed_chunks_count - start_idx * batch_size) )
-
-
-                        except Exception as e:
-                            if status_callback:
-                                status_callback(f"Error processing chunk {os.path.basename(chunk_path)}: {str(e)}")
+                    decompressed_data = decompressor.decompress(chunk_data)
+                    
+                    if status_callback and detailed_logging_active:
+                        status_callback(f"Decompressed chunk seq: {metadata['sequenceNumber']}, output data length: {len(decompressed_data)}, first 10 output bytes: {decompressed_data[:10].hex() if decompressed_data else 'EMPTY_OUTPUT'}")
+                    
+                    bytes_written = output_file.write(decompressed_data)
+                    if hasher:
+                        hasher.update(decompressed_data)
+                    
+                    if status_callback and detailed_logging_active:
+                        status_callback(f"Wrote {bytes_written} decompressed bytes for seq {metadata['sequenceNumber']} to {output_path}. Decompressed size: {len(decompressed_data)}")
+                    
+                    chunk_data = None
+                    decompressed_data = None
+                    processed_chunks_count += 1
+                results = None
+                update_progress()
             
             final_decompressed_data = decompressor.flush()
             if status_callback:
@@ -433,6 +485,8 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
 
             if final_decompressed_data:
                 bytes_written = output_file.write(final_decompressed_data)
+                if hasher:
+                    hasher.update(final_decompressed_data)
                 if status_callback:
                     status_callback(f"Wrote {bytes_written} final flushed decompressed bytes to {output_path}.")
             
@@ -450,7 +504,7 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
             if status_callback:
                 status_callback(f"File {output_path} does NOT exist on disk after processing (this is unexpected).")
         
-        update_progress(total_batches, force=True)
+        update_progress(force=True)
 
         if total_chunks > 0 and os.path.exists(output_path) and os.path.getsize(output_path) == 0:
             if status_callback:
@@ -467,13 +521,97 @@ def process_chunks_streaming(chunk_files, output_path, encrypt, key_string,
             status_callback(f"Error processing chunks: {str(e)}")
         raise
 
+def _write_at(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        with _WRITE_AT_LOCK:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+def process_chunks_blocks(chunk_files, chunk_seqs, start_seq, blocks, output_path, encrypt, key_string,
+                          status_callback=None, cancel_check=None,
+                          progress_callback=None, progress_range=(0, 100), hasher=None):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    chunks_by_seq = dict(zip(chunk_seqs, chunk_files))
+    block_ranges = []
+    block_seq = start_seq
+    block_offset = 0
+    for block_chunk_count, block_raw_size in blocks:
+        block_ranges.append((block_seq, block_chunk_count, block_offset, block_raw_size))
+        block_seq += block_chunk_count
+        block_offset += block_raw_size
+    
+    def decode_block(block_idx):
+        first_seq, block_chunk_count, offset, raw_size = block_ranges[block_idx]
+        missing = [seq for seq in range(first_seq, first_seq + block_chunk_count) if seq not in chunks_by_seq]
+        if missing:
+            raise ValueError(f"missing chunks {missing[:5]}")
+        block_chunks = [chunks_by_seq[seq] for seq in range(first_seq, first_seq + block_chunk_count)]
+        results, errors = process_chunks_batch(block_chunks, encrypt, key_string)
+        if errors:
+            raise ValueError(f"{len(errors)} damaged chunks, first: {errors[0][1]}")
+        decompressed_data = zlib.decompress(b''.join(chunk_data for _, _, chunk_data in results))
+        if len(decompressed_data) != raw_size:
+            raise ValueError(f"decompressed {len(decompressed_data)} bytes, expected {raw_size}")
+        _write_at(fd, decompressed_data, offset)
+        return decompressed_data
+    
+    start_progress, end_progress = progress_range
+    thread_count = min(len(block_ranges), get_optimal_thread_count("cpu_heavy", total_items=len(block_ranges)))
+    failed_blocks = 0
+    
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+    try:
+        os.ftruncate(fd, block_offset)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, thread_count)) as executor:
+            window_size = max(1, thread_count) * 2
+            block_window = collections.deque()
+            next_block_idx = 0
+            done_count = 0
+            while next_block_idx < len(block_ranges) or block_window:
+                while next_block_idx < len(block_ranges) and len(block_window) < window_size:
+                    block_window.append((next_block_idx, executor.submit(decode_block, next_block_idx)))
+                    next_block_idx += 1
+                block_idx, future = block_window.popleft()
+                try:
+                    decompressed_data = future.result()
+                    if hasher:
+                        hasher.update(decompressed_data)
+                except Exception as e:
+                    failed_blocks += 1
+                    _, _, offset, raw_size = block_ranges[block_idx]
+                    if status_callback:
+                        status_callback(f"Error decoding block {block_idx} (bytes {offset}-{offset + raw_size}) of {output_path}: {str(e)}")
+                decompressed_data = None
+                done_count += 1
+                if progress_callback:
+                    progress_callback(f"Processing blocks: {done_count}/{len(block_ranges)}",
+                                      start_progress + (done_count / len(block_ranges)) * (end_progress - start_progress))
+                if cancel_check and cancel_check():
+                    for _, pending in block_window:
+                        pending.cancel()
+                    if status_callback:
+                        status_callback("Operation cancelled")
+                    return False
+    finally:
+        os.close(fd)
+    
+    if status_callback:
+        status_callback(f"Decoded {len(block_ranges) - failed_blocks}/{len(block_ranges)} blocks into {output_path}")
+    return failed_blocks == 0
+
 def validate_and_get_type(file_path):
     try:
-        if not os.path.exists(file_path):
+        if not is_memory_chunk(file_path) and not os.path.exists(file_path):
             return None
             
-        with open(file_path, 'rb') as f:
-            header = f.read(26)
+        header = read_chunk_header(file_path)
         
         if header[:6] != b'HEADER':
             return None
@@ -483,71 +621,135 @@ def validate_and_get_type(file_path):
     except Exception:
         return None
 
-def analyze_chunks_in_db(chunk_files, db_conn, status_callback=None):
-    db_cursor = db_conn.cursor()
-    total_chunks = len(chunk_files)
-    
-    db_cursor.execute('''CREATE TABLE IF NOT EXISTS chunks (
-        seq_num INTEGER PRIMARY KEY, 
-        total_count INTEGER,
-        chunk_type TEXT,
-        file_path TEXT
-    )''')
+CHUNK_INDEX_DTYPE = np.dtype([('seq', '<u4'), ('total', '<u4'), ('is_metadata', '?'), ('source', '<u4')])
+
+class ChunkIndex:
+    def __init__(self, entries):
+        self.total_chunks = 0
+        self.rejected = 0
+        if len(entries):
+            totals, counts = np.unique(entries['total'], return_counts=True)
+            self.total_chunks = int(totals[np.argmax(counts)])
+            in_range = (entries['total'] == self.total_chunks) & (entries['seq'] < self.total_chunks)
+            self.rejected = int(len(entries) - np.count_nonzero(in_range))
+            entries = entries[in_range]
+        order = np.argsort(entries['seq'], kind='stable')
+        entries = entries[order]
+        if len(entries) > 1:
+            last_of_seq = np.append(entries['seq'][1:] != entries['seq'][:-1], True)
+            entries = entries[last_of_seq]
+        self.entries = entries
+        self.seqs = entries['seq']
+        self.present = np.zeros(self.total_chunks, dtype=bool)
+        self.present[self.seqs] = True
+        self._present_prefix = np.concatenate(([0], np.cumsum(self.present, dtype=np.int64)))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def metadata_sources(self):
+        return self.entries['source'][self.entries['is_metadata']]
+
+    def data_range(self, start_seq, count):
+        lo = np.searchsorted(self.seqs, start_seq, side='left')
+        hi = np.searchsorted(self.seqs, start_seq + count, side='left')
+        window = self.entries[lo:hi]
+        window = window[~window['is_metadata']]
+        return window['seq'], window['source']
+
+    def count_present(self, start_seq, count):
+        lo = min(max(start_seq, 0), len(self.present))
+        hi = min(max(start_seq + count, 0), len(self.present))
+        return int(self._present_prefix[hi] - self._present_prefix[lo])
+
+    def has_gap(self, start_seq, count):
+        return self.count_present(start_seq, count) != count
+
+    def missing_sequences(self, start_seq, count):
+        expected = np.arange(start_seq, start_seq + count, dtype=np.int64)
+        in_range = expected < len(self.present)
+        missing = np.ones(count, dtype=bool)
+        missing[in_range] = ~self.present[expected[in_range]]
+        return expected[missing]
+
+def build_chunk_index(chunk_files, status_callback=None):
+    entries = []
+    unnamed_chunks = []
     
-    batch_size = min(5000, max(1000, total_chunks // 10))
+    def add_entry(source_idx, chunk_path, header):
+        try:
+            header_info = header if isinstance(header, dict) else parse_chunk_header(header)
+            entries.append((header_info['sequence_number'], header_info['total_count'],
+                            header_info['is_metadata'], source_idx))
+        except Exception as e:
+            if status_callback:
+                status_callback(f"Error analyzing chunk {chunk_source_name(chunk_path)}: {str(e)}")
     
-    db_conn.execute("BEGIN TRANSACTION")
+    for source_idx, chunk_path in enumerate(chunk_files):
+        if is_memory_chunk(chunk_path):
+            add_entry(source_idx, chunk_path, bytes(chunk_path[:26]))
+            continue
+        name_info = parse_chunk_name(chunk_path)
+        if name_info:
+            add_entry(source_idx, chunk_path, name_info)
+        else:
+            unnamed_chunks.append(source_idx)
     
-    chunks_processed = 0
-    current_batch = []
+    if unnamed_chunks:
+        batches = [unnamed_chunks[i:i + HEADER_SCAN_BATCH] for i in range(0, len(unnamed_chunks), HEADER_SCAN_BATCH)]
+        thread_count = min(len(batches), HEADER_SCAN_THREADS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
+            batch_headers = executor.map(lambda batch: read_chunk_headers([chunk_files[i] for i in batch]), batches)
+            for batch, headers in zip(batches, batch_headers):
+                for source_idx, (header, error) in zip(batch, headers):
+                    if error is None:
+                        add_entry(source_idx, chunk_files[source_idx], header)
+                    elif not isinstance(error, FileNotFoundError) and status_callback:
+                        status_callback(f"Error analyzing chunk {chunk_source_name(chunk_files[source_idx])}: {str(error)}")
     
-    try:
-        for chunk_path in chunk_files:
-            if not os.path.exists(chunk_path):
-                continue
-                
-            try:
-                with open(chunk_path, 'rb') as f:
-                    header = f.read(26)
-                    
-                header_info = parse_chunk_header(header)
-                chunk_type = 'MD' if header_info['is_metadata'] else 'CH'
-                seq_num = header_info['sequence_number']
-                total_count = header_info['total_count']
-                
-                current_batch.append((seq_num, total_count, chunk_type, chunk_path))
-                chunks_processed += 1
-                
-                if len(current_batch) >= batch_size:
-                    db_cursor.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", current_batch)
-                    db_conn.commit()
-                    current_batch = []
-            except Exception as e:
-                if status_callback:
-                    status_callback(f"Error analyzing chunk {os.path.basename(chunk_path)}: {str(e)}")
-        
-        if current_batch:
-            db_cursor.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", current_batch)
-            db_conn.commit()
-            
-        db_cursor.execute("CREATE INDEX IF NOT EXISTS idx_type ON chunks(chunk_type)")
-        db_conn.commit()
-        
-        return chunks_processed
-        
-    except Exception as e:
-        db_conn.rollback()
+    chunk_index = ChunkIndex(np.array(entries, dtype=CHUNK_INDEX_DTYPE))
+    if chunk_index.rejected and status_callback:
+        status_callback(f"Ignoring {chunk_index.rejected} chunks whose sequence number lies outside the "
+                        f"{chunk_index.total_chunks}-chunk transfer")
+    return chunk_index
+
+def check_metadata_key(metadata, encrypt, key_string, status_callback=None):
+    if metadata.get('encrypted', False) != encrypt:
         if status_callback:
-            status_callback(f"Error during chunk analysis: {str(e)}")
-        raise
+            if metadata.get('encrypted', False):
+                status_callback("Error: Chunks are encrypted but decryption not enabled")
+            else:
+                status_callback("Error: Decryption enabled but chunks are not encrypted")
+        return False
+    
+    if encrypt and metadata.get('key_verification'):
+        if metadata.get('key_verification') != calculate_checksum(string_to_key(key_string)):
+            if status_callback:
+                status_callback("Error: Invalid decryption key")
+            return False
+    return True
+
+def resolve_output_path(file_info, processed_target_paths):
+    desired_rel_path = file_info.get('original_path', file_info['path'])
+    if desired_rel_path in processed_target_paths:
+        path_obj = Path(desired_rel_path)
+        new_filename = f"{path_obj.stem}_{file_info['start_sequence']}{path_obj.suffix}"
+        file_info['path'] = str(path_obj.parent / new_filename)
+    else:
+        file_info['path'] = desired_rel_path
+    processed_target_paths[desired_rel_path] = True
+    return file_info['path']
 
 def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="", 
                     progress_callback=None, status_callback=None, cancel_check=None, force=False):
+    pack_readers = []
     try:
         if not prepare_output_directory(output_dir, allow_overwrite=force):
             if status_callback:
                 status_callback(f"Output directory {output_dir} is not empty. Use --force to overwrite.")
             return False
+        
+        chunk_files = open_chunk_sources(chunk_files, pack_readers, status_callback)
             
         if status_callback:
             status_callback(f"Processing {len(chunk_files)} chunks")
@@ -561,20 +763,17 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
         if status_callback:
             status_callback(f"Stage 1: {stages[0][0]}")
         
-        db_conn = setup_optimized_sqlite_connection()
-        
-        chunks_processed = analyze_chunks_in_db(chunk_files, db_conn, status_callback)
+        chunk_index = build_chunk_index(chunk_files, status_callback)
+        chunks_processed = len(chunk_index)
         
         if chunks_processed == 0:
             if status_callback:
                 status_callback("Error: No chunks could be analyzed")
-            db_conn.close()
             return False
             
         if cancel_check and cancel_check():
             if status_callback:
                 status_callback("Operation cancelled")
-            db_conn.close()
             return False
         
         if status_callback:
@@ -586,14 +785,11 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
         if status_callback:
             status_callback(f"Stage 2: {stages[1][0]}")
         
-        db_cursor = db_conn.cursor()
-        db_cursor.execute("SELECT file_path FROM chunks WHERE chunk_type = 'MD' ORDER BY seq_num")
-        metadata_files = [row[0] for row in db_cursor.fetchall()]
+        metadata_files = [chunk_files[source_idx] for source_idx in chunk_index.metadata_sources()]
         
         if not metadata_files:
             if status_callback:
                 status_callback("Error: No metadata chunks found")
-            db_conn.close()
             return False
         
         metadata = extract_metadata_from_files(metadata_files, encrypt, key_string, status_callback)
@@ -602,46 +798,25 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
             file_count = len(metadata.get('files', []))
             status_callback(f"Found {file_count} files in metadata")
         
-        if metadata.get('encrypted', False) != encrypt:
-            if status_callback:
-                if metadata.get('encrypted', False):
-                    status_callback("Error: Chunks are encrypted but decryption not enabled")
-                else:
-                    status_callback("Error: Decryption enabled but chunks are not encrypted")
-            db_conn.close()
+        if not check_metadata_key(metadata, encrypt, key_string, status_callback):
             return False
         
-        if encrypt and metadata.get('key_verification'):
-            if metadata.get('key_verification') != calculate_checksum(string_to_key(key_string)):
-                if status_callback:
-                    status_callback("Error: Invalid decryption key")
-                db_conn.close()
-                return False
-        
         if progress_callback:
             progress_callback("Metadata processed", stages[2][1])
         
         if status_callback:
             status_callback(f"Stage 3: {stages[2][0]}")
         
-        total_data_chunks = sum(file_info.get('chunk_count', 0) for file_info in metadata['files'])
+        total_data_chunks = metadata.get('total_data_chunks')
+        if total_data_chunks is None:
+            total_data_chunks = sum(file_info.get('chunk_count', 0) for file_info in metadata['files'])
         if status_callback:
             status_callback(f"Processing {total_data_chunks} data chunks across {len(metadata['files'])} files")
         
         file_thread_count = get_optimal_thread_count(total_items=len(metadata['files']))
         
         processed_target_paths = {}
-        for file_info in metadata['files']:
-            desired_rel_path = file_info.get('original_path', file_info['path'])
-
-            if desired_rel_path in processed_target_paths:
-                path_obj = Path(desired_rel_path)
-                new_filename = f"{path_obj.stem}_{file_info['start_sequence']}{path_obj.suffix}"
-                file_info['path'] = str(path_obj.parent / new_filename)
-            else:
-                file_info['path'] = desired_rel_path
-            
-            processed_target_paths[desired_rel_path] = True
+        progress_chunks = 0
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=file_thread_count) as thread_pool:
             file_futures = []
@@ -650,34 +825,36 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
                 if cancel_check and cancel_check():
                     if status_callback:
                         status_callback("Operation cancelled")
-                    db_conn.close()
                     return False
                 
+                resolve_output_path(file_info, processed_target_paths)
+                file_progress_start = progress_chunks
+                progress_chunks += file_info.get('chunk_count', 0)
+                
                 start_seq = file_info['start_sequence']
                 chunk_count = file_info['chunk_count']
                 
-                db_cursor.execute(
-                    "SELECT file_path FROM chunks WHERE chunk_type = 'CH' AND seq_num >= ? AND seq_num < ? ORDER BY seq_num",
-                    (start_seq, start_seq + chunk_count)
-                )
-                file_chunks = [row[0] for row in db_cursor.fetchall()]
+                file_chunk_seqs, file_chunk_sources = chunk_index.data_range(start_seq, chunk_count)
+                file_chunks = [chunk_files[source_idx] for source_idx in file_chunk_sources]
+                file_chunk_seqs = file_chunk_seqs.tolist()
                 
                 current_file_path = file_info.get('path', '')
                 if status_callback:
-                    status_callback(f"DEBUG_REASSEMBLE: File {current_file_path}, StartSeq: {start_seq}, ChunkCount: {chunk_count}, Identified Chunks: {len(file_chunks)} chunks: {file_chunks[:5]}...")
+                    status_callback(f"DEBUG_REASSEMBLE: File {current_file_path}, StartSeq: {start_seq}, ChunkCount: {chunk_count}, Identified Chunks: {len(file_chunks)} chunks: {[chunk_source_name(c) for c in file_chunks[:5]]}...")
 
-                if len(file_chunks) != chunk_count:
+                if chunk_index.has_gap(start_seq, chunk_count):
+                    present_count = chunk_index.count_present(start_seq, chunk_count)
                     if status_callback:
                         status_callback(f"Warning: Missing chunks for {file_info['path']} " +
-                                      f"(found {len(file_chunks)}/{chunk_count})")
-                    if len(file_chunks) == 0:
+                                      f"(found {present_count}/{chunk_count}, first missing: {chunk_index.missing_sequences(start_seq, chunk_count)[:5].tolist()})")
+                    if present_count == 0:
                         continue
                 
                 rel_path = file_info['path']
                 output_path = os.path.join(output_dir, rel_path)
                 os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 
-                def process_file(file_chunks, output_path, file_info, file_idx):
+                def process_file(file_chunks, file_chunk_seqs, output_path, file_info, file_idx, file_progress_start):
                     try:
                         if cancel_check and cancel_check():
                             if status_callback:
@@ -685,19 +862,27 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
                             return False
                         
                         if total_data_chunks > 0:
-                            progress_chunks = sum(f.get('chunk_count', 0) for f in metadata['files'][:file_idx])
-                            start_pct = 40 + (progress_chunks / total_data_chunks * 60)
+                            start_pct = 40 + (file_progress_start / total_data_chunks * 60)
                             chunk_ratio = file_info['chunk_count'] / total_data_chunks
                             end_pct = start_pct + (chunk_ratio * 60)
                             file_progress_range = (start_pct, end_pct)
                         else:
                             file_progress_range = (40, 100)
                         
-                        result = process_chunks_streaming(
-                            file_chunks, output_path, encrypt, key_string, 
-                            status_callback, cancel_check, 
-                            progress_callback, file_progress_range
-                        )
+                        file_hasher = hashlib.sha256()
+                        if file_info.get('blocks'):
+                            result = process_chunks_blocks(
+                                file_chunks, file_chunk_seqs, file_info['start_sequence'], file_info['blocks'],
+                                output_path, encrypt, key_string,
+                                status_callback, cancel_check,
+                                progress_callback, file_progress_range, hasher=file_hasher
+                            )
+                        else:
+                            result = process_chunks_streaming(
+                                file_chunks, output_path, encrypt, key_string, 
+                                status_callback, cancel_check, 
+                                progress_callback, file_progress_range, hasher=file_hasher
+                            )
                         
                         if result is False:
                             if status_callback:
@@ -712,8 +897,7 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
                             file_verified = False
                             if expected_checksum:
                                 try:
-                                    with open(output_path, 'rb') as f_check:
-                                        actual_checksum = calculate_checksum(f_check.read())
+                                    actual_checksum = file_hasher.hexdigest()
                                     if actual_checksum == expected_checksum:
                                         if status_callback:
                                             status_callback(f"Checksum VERIFIED for {file_info['path']}. Size: {actual_size} (Expected: {expected_size})")
@@ -776,7 +960,7 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
                         return False
                 
                 future = thread_pool.submit(
-                    process_file, file_chunks, output_path, file_info, file_idx
+                    process_file, file_chunks, file_chunk_seqs, output_path, file_info, file_idx, file_progress_start
                 )
                 file_futures.append(future)
                 
@@ -807,7 +991,6 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
                 if failed_files > 0 and status_callback:
                     status_callback(f"Warning: {failed_files} files failed to process correctly")
         
-        db_conn.close()
         
         if status_callback:
             status_callback("File reassembly completed")
@@ -822,4 +1005,281 @@ def reassemble_files(chunk_files, output_dir, encrypt=True, key_string="",
     except Exception as e:
         if status_callback:
             status_callback(f"Error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        for reader in pack_readers:
+            reader.close()
+
+STREAM_REORDER_WINDOW = 4096
+STREAM_PROGRESS_INTERVAL = 64
+
+class StreamingReassembler:
+    def __init__(self, output_dir, encrypt=True, key_string="", progress_callback=None,
+                 status_callback=None, force=False, reorder_window=STREAM_REORDER_WINDOW):
+        if not prepare_output_directory(output_dir, allow_overwrite=force):
+            raise ValueError(f"Output directory {output_dir} is not empty. Use --force to overwrite.")
+        self.output_dir = output_dir
+        self.encrypt = encrypt
+        self.key_string = key_string
+        self.progress_callback = progress_callback
+        self.status_callback = status_callback
+        self.reorder_window = reorder_window
+        self.metadata = None
+        self.failed = False
+        self.files_done = 0
+        self.files_verified = 0
+        self._metadata_chunks = {}
+        self._metadata_count = None
+        self._pending = {}
+        self._files = []
+        self._file_starts = None
+        self._next_seqs = None
+        self._open_files = {}
+        self._total_data_chunks = 0
+        self._chunks_written = 0
+        self._buffer = bytearray(CHUNK_SLOT_SIZE)
+        self._closed = False
+    
+    @property
+    def complete(self):
+        return self.metadata is not None and self.files_done == len(self._files)
+    
+    def _status(self, message):
+        if self.status_callback:
+            self.status_callback(message)
+    
+    def feed(self, chunk_bytes):
+        if self._closed or self.failed or self.complete:
+            return False
+        try:
+            header_info = parse_chunk_header(bytes(chunk_bytes[:26]))
+        except Exception as e:
+            self._status(f"Error reading streamed chunk header: {str(e)}")
+            return False
+        
+        seq = header_info['sequence_number']
+        if header_info['is_metadata']:
+            return self._feed_metadata(seq, chunk_bytes)
+        
+        if seq in self._pending:
+            return False
+        file_idx = None
+        if self.metadata is not None:
+            file_idx = self._file_for_seq(seq)
+            if file_idx is None or seq < self._next_seqs[file_idx]:
+                return False
+        if file_idx is None or seq > self._next_seqs[file_idx]:
+            if self.reorder_window is not None and len(self._pending) >= self.reorder_window:
+                self._status(f"Reorder window full ({self.reorder_window} chunks), dropping chunk {seq}")
+                return False
+            data = self._verify_chunk(seq, chunk_bytes)
+            if data is None:
+                return False
+            self._pending[seq] = bytes(data)
+            return True
+        
+        data = self._verify_chunk(seq, chunk_bytes)
+        if data is None:
+            return False
+        self._write_data(file_idx, data)
+        self._drain_file(file_idx)
+        return True
+    
+    def _verify_chunk(self, seq, chunk_bytes):
+        try:
+            _, data = process_chunk_file(chunk_bytes, self.encrypt, self.key_string, buffer=self._buffer)
+        except Exception as e:
+            self._status(f"Dropping damaged chunk {seq}: {str(e)}")
+            return None
+        return data
+    
+    def _feed_metadata(self, seq, chunk_bytes):
+        if self.metadata is not None or seq in self._metadata_chunks:
+            return False
+        try:
+            _, data = process_chunk_file(chunk_bytes, self.encrypt, self.key_string)
+        except Exception as e:
+            self._status(f"Dropping damaged metadata chunk {seq}: {str(e)}")
+            return False
+        if seq == 0:
+            if bytes(data[:len(METADATA_PREFIX_MAGIC)]) == METADATA_PREFIX_MAGIC:
+                self._metadata_count = METADATA_PREFIX_STRUCT.unpack_from(data)[1]
+            else:
+                self._metadata_count = 0
+        self._metadata_chunks[seq] = bytes(chunk_bytes)
+        self._load_metadata()
+        return True
+    
+    def _load_metadata(self):
+        if self._metadata_count is None:
+            return
+        contiguous = 0
+        while contiguous in self._metadata_chunks:
+            contiguous += 1
+        if contiguous < self._metadata_count:
+            return
+        
+        try:
+            metadata = extract_metadata_from_files(
+                [self._metadata_chunks[seq] for seq in range(contiguous)], self.encrypt, self.key_string
+            )
+        except ValueError as e:
+            # Legacy metadata carries no chunk count, so a failed parse just means more chunks are due.
+            if self._metadata_count:
+                self._status(f"Error parsing streamed metadata: {str(e)}")
+            return
+        
+        if not check_metadata_key(metadata, self.encrypt, self.key_string, self.status_callback):
+            self.failed = True
+            return
+        
+        files = list(metadata['files'])
+        processed_target_paths = {}
+        for file_info in files:
+            resolve_output_path(file_info, processed_target_paths)
+        
+        self.metadata = metadata
+        self._metadata_chunks = None
+        self._files = files
+        self._file_starts = np.array([file_info['start_sequence'] for file_info in files], dtype=np.int64)
+        self._next_seqs = self._file_starts.copy()
+        self._total_data_chunks = sum(file_info['chunk_count'] for file_info in files)
+        self._status(f"Found {len(files)} files in metadata ({self._total_data_chunks} data chunks)")
+        
+        for file_idx, file_info in enumerate(files):
+            if file_info['chunk_count'] == 0:
+                self._open_file(file_idx)
+                self._finish_file(file_idx)
+        for file_idx in sorted({self._file_for_seq(seq) for seq in self._pending} - {None}):
+            self._drain_file(file_idx)
+        for seq in [seq for seq in self._pending if self._file_for_seq(seq) is None]:
+            del self._pending[seq]
+    
+    def _file_for_seq(self, seq):
+        file_idx = int(np.searchsorted(self._file_starts, seq, side='right')) - 1
+        if file_idx < 0:
+            return None
+        file_info = self._files[file_idx]
+        if seq >= file_info['start_sequence'] + file_info['chunk_count']:
+            return None
+        return file_idx
+    
+    def _drain_file(self, file_idx):
+        end_seq = self._files[file_idx]['start_sequence'] + self._files[file_idx]['chunk_count']
+        while self._next_seqs[file_idx] < end_seq:
+            data = self._pending.pop(int(self._next_seqs[file_idx]), None)
+            if data is None:
+                return
+            self._write_data(file_idx, data)
+    
+    def _open_file(self, file_idx):
+        file_info = self._files[file_idx]
+        output_path = os.path.join(self.output_dir, file_info['path'])
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        state = {
+            'path': output_path,
+            'file': open(output_path, 'wb'),
+            'decompressor': zlib.decompressobj(),
+            'hasher': hashlib.sha256(),
+            'size': 0
+        }
+        self._open_files[file_idx] = state
+        return state
+    
+    def _write_data(self, file_idx, data):
+        seq = int(self._next_seqs[file_idx])
+        state = self._open_files.get(file_idx) or self._open_file(file_idx)
+        try:
+            while data:
+                decompressed_data = state['decompressor'].decompress(data)
+                state['file'].write(decompressed_data)
+                state['hasher'].update(decompressed_data)
+                state['size'] += len(decompressed_data)
+                if not state['decompressor'].eof:
+                    break
+                # Block-mode files are a run of independent zlib streams.
+                data = state['decompressor'].unused_data
+                state['decompressor'] = zlib.decompressobj()
+        except zlib.error as e:
+            self._finish_file(file_idx, f"decompression failed at chunk {seq}: {str(e)}")
+            return
+        
+        self._next_seqs[file_idx] += 1
+        self._chunks_written += 1
+        file_info = self._files[file_idx]
+        if self._next_seqs[file_idx] == file_info['start_sequence'] + file_info['chunk_count']:
+            self._finish_file(file_idx)
+        elif self.progress_callback and self._chunks_written % STREAM_PROGRESS_INTERVAL == 0:
+            self._report_progress()
+    
+    def _finish_file(self, file_idx, error=None):
+        state = self._open_files.pop(file_idx)
+        file_info = self._files[file_idx]
+        end_seq = file_info['start_sequence'] + file_info['chunk_count']
+        verified = False
+        
+        if error is None:
+            final_data = state['decompressor'].flush()
+            state['file'].write(final_data)
+            state['hasher'].update(final_data)
+            state['size'] += len(final_data)
+        state['file'].close()
+        
+        expected_size = file_info.get('size', 0)
+        expected_checksum = file_info.get('checksum')
+        if error is not None:
+            self._status(f"Error processing {file_info['path']}: {error}")
+        elif expected_checksum and state['hasher'].hexdigest() != expected_checksum:
+            self._status(f"CRITICAL: Checksum MISMATCH for {file_info['path']}. " +
+                         f"Expected {expected_checksum}, got {state['hasher'].hexdigest()}. " +
+                         f"File size: {state['size']} (Expected: {expected_size}).")
+        elif state['size'] != expected_size:
+            self._status(f"Warning: Size MISMATCH for {file_info['path']}. " +
+                         f"Expected {expected_size} bytes, got {state['size']} bytes.")
+        else:
+            verified = True
+            self._status(f"Successfully reconstructed and verified: {file_info['path']}")
+        
+        for seq in range(int(self._next_seqs[file_idx]), end_seq):
+            self._pending.pop(seq, None)
+        self._next_seqs[file_idx] = end_seq
+        self.files_done += 1
+        self.files_verified += verified
+        if self.progress_callback:
+            self._report_progress()
+    
+    def _report_progress(self):
+        progress_pct = 100 * self._chunks_written / self._total_data_chunks if self._total_data_chunks else 100
+        self.progress_callback(f"Reassembled {self.files_done}/{len(self._files)} files", progress_pct)
+    
+    def close(self):
+        if self._closed:
+            return self.complete and self.files_verified == len(self._files)
+        self._closed = True
+        
+        for state in self._open_files.values():
+            state['file'].close()
+        self._open_files.clear()
+        
+        if self.metadata is None:
+            self._status("Error: Stream ended before all metadata chunks arrived")
+            self._pending.clear()
+            return False
+        
+        for file_idx, file_info in enumerate(self._files):
+            end_seq = file_info['start_sequence'] + file_info['chunk_count']
+            if self._next_seqs[file_idx] < end_seq:
+                buffered = sum(1 for seq in range(int(self._next_seqs[file_idx]), end_seq) if seq in self._pending)
+                self._status(f"Warning: Missing chunks for {file_info['path']} " +
+                             f"(stream ended waiting for chunk {self._next_seqs[file_idx]}, " +
+                             f"{buffered} later chunks buffered)")
+        self._pending.clear()
+        
+        self._status(f"File reassembly completed ({self.files_verified}/{len(self._files)} files verified)")
+        return self.complete and self.files_verified == len(self._files)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
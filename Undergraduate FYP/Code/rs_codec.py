@@ -0,0 +1,85 @@
+import numpy as np
+from reedsolo import RSCodec
+
+GF_PRIM = 0x11d
+GF_GENERATOR = 2
+GF_FCR = 0
+
+_RS_CODECS = {}
+_BATCH_RS_CODECS = {}
+
+def get_rs_codec(n, k):
+    codec = _RS_CODECS.get((n, k))
+    if codec is None:
+        codec = RSCodec(nsym=n - k, nsize=n, fcr=GF_FCR, prim=GF_PRIM, generator=GF_GENERATOR)
+        _RS_CODECS[(n, k)] = codec
+    return codec
+
+def _build_gf_tables(prim=GF_PRIM):
+    gf_exp = np.zeros(510, dtype=np.int32)
+    gf_log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        gf_exp[i] = x
+        gf_log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= prim
+    gf_exp[255:510] = gf_exp[:255]
+
+    logs = gf_log[1:]
+    gf_mul = np.zeros((256, 256), dtype=np.uint8)
+    gf_mul[1:, 1:] = gf_exp[(logs[:, np.newaxis] + logs[np.newaxis, :]) % 255]
+    return gf_exp, gf_log, gf_mul
+
+GF_EXP, GF_LOG, GF_MUL = _build_gf_tables()
+
+class BatchRSCodec:
+    def __init__(self, n, k):
+        self.n = n
+        self.k = k
+        self.nsym = n - k
+        self.codec = get_rs_codec(n, k)
+        self.parity_matrix = self._build_parity_matrix()
+        self.syndrome_matrix = self._build_syndrome_matrix()
+
+    def _build_parity_matrix(self):
+        gen = [int(c) for c in self.codec.gen[self.nsym]]
+        gen_tail = np.array(gen[1:], dtype=np.uint8)
+
+        parity_matrix = np.zeros((self.k, self.nsym), dtype=np.uint8)
+        remainder = gen_tail.copy()
+        for row in range(self.k - 1, -1, -1):
+            parity_matrix[row] = remainder
+            lead = remainder[0]
+            remainder = np.append(remainder[1:], np.uint8(0))
+            if lead:
+                remainder ^= GF_MUL[lead, gen_tail]
+        parity_matrix.setflags(write=False)
+        return parity_matrix
+
+    def _build_syndrome_matrix(self):
+        powers = np.arange(self.n - 1, -1, -1, dtype=np.int64)[:, np.newaxis]
+        roots = np.arange(GF_FCR, GF_FCR + self.nsym, dtype=np.int64)[np.newaxis, :]
+        syndrome_matrix = GF_EXP[(roots * GF_LOG[GF_GENERATOR] * powers) % 255].astype(np.uint8)
+        syndrome_matrix.setflags(write=False)
+        return syndrome_matrix
+
+    def encode_blocks(self, data_blocks):
+        data_blocks = np.asarray(data_blocks, dtype=np.uint8).reshape(-1, self.k)
+        parity = np.bitwise_xor.reduce(GF_MUL[data_blocks[:, :, np.newaxis], self.parity_matrix[np.newaxis, :, :]], axis=1)
+        return np.concatenate((data_blocks, parity), axis=1)
+
+    def syndromes(self, blocks):
+        blocks = np.asarray(blocks, dtype=np.uint8).reshape(-1, self.n)
+        return np.bitwise_xor.reduce(GF_MUL[blocks[:, :, np.newaxis], self.syndrome_matrix[np.newaxis, :, :]], axis=1)
+
+    def clean_block_mask(self, blocks):
+        return ~np.any(self.syndromes(blocks), axis=1)
+
+def get_batch_rs_codec(n, k):
+    batch_codec = _BATCH_RS_CODECS.get((n, k))
+    if batch_codec is None:
+        batch_codec = BatchRSCodec(n, k)
+        _BATCH_RS_CODECS[(n, k)] = batch_codec
+    return batch_codec
@@ -25,6 +25,7 @@ c_COLOR_IMAGES_DIR = os.path.join(BASE_DIR, "c_COLOR_images")
 DECODED_CHUNKS_DIR = os.path.join(BASE_DIR, "decoded_chunks")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 ENCRYPTION_KEY = "your-secure-test-key123"
+DECODE_WORKERS = os.cpu_count() or 1
 
 def setup_directories():
     logging.info("Setting up directories...")
@@ -164,46 +165,22 @@ def run_decode_process():
     total_images_to_decode = len(image_files)
     decoded_count = 0
     logging.info(f"Starting decoding of {total_images_to_decode} images...")
-    for image_filename in image_files:
-        c_COLOR_image_path = os.path.join(c_COLOR_IMAGES_DIR, image_filename)
-        
+    if not hasattr(decode, 'decode_images_parallel'):
+        logging.error("Suitable decode function (e.g., 'decode_images_parallel') not found in decode.py.")
+        return False
+
+    image_paths = [os.path.join(c_COLOR_IMAGES_DIR, image_filename) for image_filename in image_files]
+    for c_COLOR_image_path, decoded_payload_bytes, decode_error in decode.decode_images_parallel(image_paths, workers=DECODE_WORKERS):
+        image_filename = os.path.basename(c_COLOR_image_path)
         reconstructed_chunk_filename = os.path.splitext(image_filename)[0] + ".bin"
         reconstructed_chunk_path = os.path.join(DECODED_CHUNKS_DIR, reconstructed_chunk_filename)
 
         logging.info(f"Processing image {c_COLOR_image_path} to reconstruct chunk {reconstructed_chunk_path}...")
         try:
-            decoded_payload_bytes = None
-
-            if hasattr(decode, 'decode_c_COLOR_payload_from_image'):
-                logging.info(f"Attempting to decode {c_COLOR_image_path} directly to memory...")
-                decoded_payload_bytes = decode.decode_c_COLOR_payload_from_image(c_COLOR_image_path)
-                if decoded_payload_bytes is None:
-                    logging.error(f"decode_c_COLOR_payload_from_image failed for {c_COLOR_image_path} (returned None).")
-                    success = False
-                    continue
-            elif hasattr(decode, 'decode_c_COLOR_to_chunk'):
-                temp_payload_filename = f"temp_payload_{reconstructed_chunk_filename}"
-                temp_payload_path = os.path.join(DECODED_CHUNKS_DIR, temp_payload_filename)
-                
-                logging.info(f"Decoding {c_COLOR_image_path} to temporary payload file {temp_payload_path}...")
-                decode.decode_c_COLOR_to_chunk(c_COLOR_image_path, temp_payload_path)
-
-                if not os.path.exists(temp_payload_path):
-                    logging.error(f"decode_c_COLOR_to_chunk failed to create temporary payload file {temp_payload_path} for image {c_COLOR_image_path}.")
-                    success = False
-                    continue
-                
-                with open(temp_payload_path, 'rb') as f_payload:
-                    decoded_payload_bytes = f_payload.read()
-                
-                try:
-                    os.remove(temp_payload_path)
-                except OSError as e_rm:
-                    logging.warning(f"Could not remove temporary payload file {temp_payload_path}: {e_rm}")
-            else:
-                logging.error("Suitable decode function (e.g., 'decode_c_COLOR_payload_from_image' or 'decode_c_COLOR_to_chunk') not found in decode.py.")
+            if decode_error is not None:
+                logging.error(f"Decoding failed for {c_COLOR_image_path}: {decode_error}")
                 success = False
-                break
+                continue
 
             if decoded_payload_bytes is None:
                 logging.error(f"Failed to obtain decoded payload for {c_COLOR_image_path} after attempting all methods.")